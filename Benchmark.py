@@ -0,0 +1,103 @@
+from QubitEBLDesignV1 import *
+import argparse
+import glob
+import json
+import platform
+import resource
+import tempfile
+import time
+# times the component builders, the operations and the wafer builds: python Benchmark.py [--out file] [--compare file]
+# the results are stored as JSON, --compare prints the ratio to an earlier run
+abspath = os.path.abspath(__file__)
+dname = os.path.dirname(abspath)
+os.chdir(dname)
+
+def bestOf(function, repeat):
+    seconds = []
+    for i in range(repeat):
+        clearCaches() # every run starts cold, the memoized builders would otherwise only be timed once
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds), result
+def primitives(conf: DefaultConfig, texts):
+    # name -> function, the inputs of the operations are built beforehand
+    chip = filledChip(conf, texts)
+    leads = list(qubitLead(conf, isCirc=True))
+    snake1 = snake(conf, direction=False)
+    return {
+        'bridgeFreeJJ': lambda: bridgeFreeJJ.__wrapped__(conf),
+        'qubitLead': lambda: list(qubitLead.__wrapped__(conf, isCirc=True)),
+        'discharger': lambda: discharger.__wrapped__(conf),
+        'snake': lambda: snake.__wrapped__(conf, direction=False),
+        'qubit': lambda: qubit.__wrapped__(conf, test=False, isCirc=True),
+        'join': lambda: [join(leads)],
+        'makeBorder': lambda: [makeBorder(conf, snake1)],
+        'makeGrid': lambda: makeGrid(conf, chip),
+        'filledChip': lambda: filledChip(conf, texts),
+    }
+def benchPrimitives(spec, repeat):
+    conf0 = DefaultConfig().replace(**spec.get('config', {}))
+    conf, texts = sweepJobs(conf0, spec['sweep'])[0]
+    results = {}
+    for name, function in primitives(conf, texts).items():
+        seconds, parts = bestOf(function, repeat)
+        polygons, vertices = countVertices(parts)
+        results[name] = {'seconds': seconds, 'polygons': polygons, 'vertices': vertices}
+    return results
+def benchWafer(filename, hierarchical, processes):
+    # runs in its own process, so that peak memory and caches belong to this wafer alone
+    spec = loadSpec(filename)
+    with tempfile.TemporaryDirectory() as directory:
+        spec['file'] = os.path.join(directory, os.path.basename(spec['file']))
+        start = time.perf_counter()
+        buildWafer(spec, hierarchical, processes, cache=False)
+        seconds = time.perf_counter() - start
+        # the dies are built in the pool of buildWafer with processes > 1, its workers are done by now
+        # and count as children: the peak is that of the largest process, not the sum of them
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024 # kB on linux
+        size = os.path.getsize(spec['file'])
+        polygons = gdspy.GdsLibrary(infile=spec['file']).top_level()[0].get_polygons()
+    return {'seconds': seconds, 'polygons': len(polygons), 'vertices': sum(map(len, polygons)),
+        'bytes': size, 'peakRSS': peak, 'processes': processes}
+def benchWafers(filenames, hierarchical, processes):
+    results = {}
+    for filename in filenames:
+        with ProcessPoolExecutor(1) as pool:
+            result = pool.submit(benchWafer, filename, hierarchical, processes).result()
+        results[os.path.splitext(os.path.basename(filename))[0] + ('_hierarchical' if hierarchical else '')] = result
+    return results
+def compare(results, previous):
+    for group in ('primitives', 'wafers'):
+        for name, result in results[group].items():
+            old = previous.get(group, {}).get(name)
+            if old:
+                print('%-24s %8.3f s  %8.3f s  x%.2f' % (name, old['seconds'], result['seconds'], old['seconds'] / result['seconds']))
+
+if __name__ == '__main__': # the wafer builds run in worker processes which import this script as well
+    parser = argparse.ArgumentParser(description='Benchmark of the builders and the wafer builds.')
+    parser.add_argument('specs', nargs='*', help='wafer specs, defaults to Chip*/Chip*.toml')
+    parser.add_argument('--repeat', type=int, default=3, help='the best of this many runs is kept for every builder')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes of the wafer builds')
+    parser.add_argument('--out', default='benchmark.json', help='file the results are written to')
+    parser.add_argument('--compare', help='results of an earlier run')
+    args = parser.parse_args()
+    specs = args.specs or sorted(glob.glob('Chip*/Chip*.toml'))
+    results = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'gdspy': gdspy.__version__, 'numpy': np.__version__, 'cpus': os.cpu_count(),
+        },
+        'primitives': benchPrimitives(loadSpec(specs[0]), args.repeat),
+        'wafers': {**benchWafers(specs, False, args.processes), **benchWafers(specs, True, args.processes)},
+    }
+    for group in ('primitives', 'wafers'):
+        for name, result in results[group].items():
+            print('%-24s %8.3f s %7d polygons %9d vertices' % (name, result['seconds'], result['polygons'], result['vertices'])
+                + ('  %6.2f MB  peak %6.1f MB' % (result['bytes'] / 2**20, result['peakRSS'] / 2**20) if 'bytes' in result else ''))
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
@@ -0,0 +1,13 @@
+from QubitEBLDesignV1 import *
+import glob
+import os
+import sys
+# builds all wafer specs (Chip*/Chip*.toml) in one process: python BuildWafers.py [spec ...] [--preview] [--drc] [--split] [--fracture]
+abspath = os.path.abspath(__file__)
+dname = os.path.dirname(abspath)
+os.chdir(dname)
+
+if __name__ == '__main__': # worker processes import this script as well
+    specs = [a for a in sys.argv[1:] if not a.startswith('--')] or sorted(glob.glob('Chip*/Chip*.toml'))
+    buildWafers(specs, preview='--preview' in sys.argv, drc='--drc' in sys.argv, split='--split' in sys.argv,
+        fracture='--fracture' in sys.argv)
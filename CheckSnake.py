@@ -0,0 +1,50 @@
+from QubitEBLDesignV1 import *
+import sys
+# regression check of the closed-form snake: python CheckSnake.py
+# the analytic length and size (centerlineLength, snakeSize) are compared with the drawn centerline and outline,
+# and solveSnake has to give back the hooks and the final line of the length they make. The exit code is 1 on failure.
+
+def drawnLength(conf: DefaultConfig):
+    # length of the drawn centerline from the edge of the pad to the open end
+    points = snakeCenterline(conf, direction=False)
+    return np.linalg.norm(np.diff(points, axis=0), axis=1).sum() - conf.snakeRadius
+def drawnSize(conf: DefaultConfig):
+    points = snakeOutline(conf, direction=False)
+    return points.max(axis=0) - points.min(axis=0)
+def checkSnake(conf: DefaultConfig, lengthTolerance=0.5, sizeTolerance=1e-6):
+    """Differences of the analytic snake from the drawn one.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables, snakeNumHooks and snakeFinHorLineLen are checked
+        lengthTolerance (float, optional): largest difference of the lengths in um, the turns are drawn as chords. Defaults to 0.5.
+        sizeTolerance (float, optional): largest difference of the sizes in um. Defaults to 1e-6.
+
+    Returns:
+        list: the failed checks as text, empty if the snake passes
+    """
+    hooks, final = conf.snakeNumHooks, conf.snakeFinHorLineLen
+    failures = []
+    length, drawn = snakeLength(conf), drawnLength(conf)
+    if abs(length - drawn) > lengthTolerance:
+        failures.append('length %.3f um, drawn %.3f um' % (length, drawn))
+    size, drawn = snakeSize(conf, hooks, final), drawnSize(conf)
+    if (np.abs(size - drawn) > sizeTolerance).any():
+        failures.append('size %g x %g um, drawn %g x %g um' % (*size, *drawn))
+    try:
+        solved = solveSnake(conf.replace(snakeMaxSize=()), length)
+        if solved[0] != hooks or abs(solved[1] - final) > 1e-6:
+            failures.append('solveSnake gives %d hooks and %.6f um' % solved)
+    except ValueError as error:
+        failures.append('solveSnake: %s' % error)
+    return failures
+
+if __name__ == '__main__':
+    conf0 = DefaultConfig()
+    failed = False
+    for hooks in range(9):
+        for final in (0, conf0.snakeHorLineLen / 2, conf0.snakeHorLineLen):
+            conf = conf0.replace(snakeNumHooks=hooks, snakeFinHorLineLen=final)
+            failures = checkSnake(conf)
+            print('%d hooks, final line %6.1f um: %s' % (hooks, final, '; '.join(failures) or 'ok'))
+            failed |= bool(failures)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,51 @@
+from QubitEBLDesignV1 import *
+import argparse
+import contextlib
+import glob
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+# geometric regression check: python CompareGds.py [new.gds golden.gds] [--skip 15]
+# without files every wafer spec is built into a temporary file and compared with the file of the spec in the repo
+abspath = os.path.abspath(__file__)
+dname = os.path.dirname(abspath)
+os.chdir(dname)
+
+def buildCopy(filename, directory, processes, pool=None):
+    # builds the wafer of a spec into directory, the file of the spec is the golden one
+    spec = loadSpec(filename)
+    golden, spec['file'] = spec['file'], os.path.join(directory, os.path.basename(spec['file']))
+    buildWafer(spec, processes=processes, cache=False, pool=pool)
+    return spec['file'], golden
+def printReport(report, locations):
+    total = 0
+    for (layer, datatype), entry in report.items():
+        total += entry['area']
+        print('layer %2d/%d: xor area %12.6g um^2 in %d tiles' % (layer, datatype, entry['area'], len(entry['locations'])))
+        for area, box in entry['locations'][:locations]:
+            print('    %12.6g um^2 at x %.3f..%.3f y %.3f..%.3f' % (area, box[0][0], box[1][0], box[0][1], box[1][1]))
+    print('total xor area %.6g um^2' % total)
+    return total
+
+if __name__ == '__main__': # worker processes import this script as well
+    parser = argparse.ArgumentParser(description='Per-layer geometric XOR of GDS files.')
+    parser.add_argument('files', nargs='*', help='new and golden GDS file, defaults to building every Chip*/Chip*.toml')
+    parser.add_argument('--skip', type=int, nargs='*', default=[], help='layers to leave out, e.g. the grid 15')
+    parser.add_argument('--tile', type=float, default=1000, help='edge length of the tiles in um')
+    parser.add_argument('--processes', type=int, help='worker processes, defaults to the number of cores')
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='largest total xor area in um^2 that passes')
+    parser.add_argument('--min-area', type=float, default=1e-3, help='smallest xor area in um^2 of a tile that is listed')
+    parser.add_argument('--locations', type=int, default=5, help='number of locations listed per layer')
+    args = parser.parse_args()
+    # the workers are started once, for building and comparing all wafers
+    processes = args.processes or os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory, \
+            (ProcessPoolExecutor(processes) if processes > 1 else contextlib.nullcontext()) as pool:
+        pairs = [args.files] if args.files else [buildCopy(f, directory, processes, pool) for f in sorted(glob.glob('Chip*/Chip*.toml'))]
+        failed = False
+        for new, golden in pairs:
+            print('%s - %s' % (new, golden))
+            total = printReport(compareGds(new, golden, args.tile, processes, args.skip, args.min_area, pool), args.locations)
+            failed |= total > args.tolerance
+    sys.exit(1 if failed else 0)
@@ -1,6 +1,7 @@
 
 """
 conda install -c conda-forge gdspy
+conda install -c conda-forge tomli (only for python < 3.11, which has no tomllib to read the wafer specs)
 
 The units used to represent shapes in the GDSII format are defined by the user. 
 The default unit in gdspy is 1 um. But that can be easily changed by the user.
@@ -8,121 +9,871 @@ The default unit in gdspy is 1 um. But that can be easily changed by the user.
 
 import gdspy
 from gdspy import copy
+import copy as pycopy
 import numpy as np 
 import math
+import hashlib
+import functools
+import itertools
+import os
+import sys
+import subprocess
+import pickle
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
+import json
+try:
+    import tomllib # python 3.11+, only needed for TOML wafer specs
+except ImportError:
+    try:
+        import tomli as tomllib # the same parser for older versions: pip install tomli
+    except ImportError:
+        tomllib = None
+from collections import OrderedDict
 pi = np.pi
 
+@dataclasses.dataclass(frozen=True)
 class DefaultConfig:
-    def __init__(self):
-        # wafer
-        self.waferRadius = 25397 # radius of the wafer
-        self.waferSliceAt = -24122 # position of the cut - the waver left from a vertical line at the specified position is removed
-        self.waferLayer = 0
-        # grid
-        self.gridSize = [290, 300] # [x,y]
-        self.gridLayer = 15
-        # chip 
-        self.chipPadding = 195 # Distances between the outwards facing edges of the markers and the boarders of the respective chip
-        self.chipMargin = 100 # distance between two chips
-        self.chipLayer = 1
-        # marker
-        self.markerLayer = 12
-        # markerL 
-        self.markerLSize = [200, 200]
-        self.markerLWidth = 20
-        self.markerLTextSize = 40
-        # markerV
-        self.markerVSize = [400, 200]
-        # resonator
-        self.resonatorSize = [152, 9143] # resonator dimensions [width, length]
-        self.resonatorLayer = 12
-        #Snake
-        self.snakeRadius = 550 
-        self.snakeThickness = 200
-        self.snakeNeck = 1100 # Starting at the center of the circle!
-        self.snakeCenTurnRad = 200 # CentralTurnRadius
-        self.snakeHorLineLen = 1400
-        self.snakeNumHooks = 4 # Number of full hooks. A hook is a 180 degree turn and a full line segment
-        self.snakeLayer = 12 # set to the same layer as resonator
-        self.snakeFinHorLineLen = 700 # len of the Final horiz line. Should be smaller then snake.HorLineLen!
-        # qubitLead           -- fine --======= corse EEEEEEEE
-        self.qubitLeadSizes = ([2, 20], [10, 100], [400, 800 ]) # fine lead, coarse lead, main body
-        self.qubitCircLeadSizes =  ([2, 20], [10, 100])
-        self.qubitCircRadius = 200
-        self.qubitTestSize  =                             80
-        self.qubitLeadGaps  = (       10,        40          )
-        self.qubitLeadOverlap =       1.5      
-        self.qubitLeadLayers = [  11,            12          ] 
-        # discharger
-        self.dischargerRadius = 400 # seems to be defined as a circle, drawn between the specified angles with the qubit center as its center.
-        self.dischargerWidth = 4
-        self.dischargerAngles = [pi/2, -pi/2]
-        self.dischargerLayer = 12
-        # bridgeFreeJJ
-        self.bridgeFreeJJSizes = ([0.58, 0.9], [0.5, 0.9], [0.4, 0.7], [1.66, 0.1])
-        self.bridgeFreeJJLayers = [8, 10, 9, 7]
-        # border
-        self.borderWidth = 0.4 # tiny layer sheating every drawn geometry
-        self.borderLayer = 6
-        # vertical distances:      markerL - markerV - resonator - qubit - markerL - testQubit
-        self.verticalDistances = [        6165,    12845,       800,    750,      685,       ]
-        # horizontal distances:      marker - marker, testQubit - testQubit
-        self.horizontalDistances = [      3500,                415         ]
-        # quantities
-        self.numTestQubits = 4
-        # UNDER TEST
-        self.padRadius = 300
+    """Immutable and hashable set of all geometric variables.
+
+    Variants are derived with replace, which shares every unchanged value with the original:
+        conf1 = conf0.replace(resonatorSize=[150, 9800])
+        conf2 = conf1.replace(bridgeFreeJJSizes=setItem(conf1.bridgeFreeJJSizes, [3, 0], 1.6))
+    Lists passed to the constructor or to replace are stored as tuples.
+    """
+    # wafer
+    waferRadius: int = 25397 # radius of the wafer
+    waferSliceAt: int = -24122 # position of the cut - the waver left from a vertical line at the specified position is removed
+    waferLayer: int = 0
+    # grid
+    gridSize: tuple = (290, 300) # [x,y]
+    gridLayer: int = 15
+    # chip 
+    chipPadding: int = 195 # Distances between the outwards facing edges of the markers and the boarders of the respective chip
+    chipMargin: int = 100 # distance between two chips
+    chipLayer: int = 1
+    # marker
+    markerLayer: int = 12
+    # markerL 
+    markerLSize: tuple = (200, 200)
+    markerLWidth: int = 20
+    markerLTextSize: int = 40
+    # markerV
+    markerVSize: tuple = (400, 200)
+    # resonator
+    resonatorSize: tuple = (152, 9143) # resonator dimensions [width, length]
+    resonatorLayer: int = 12
+    #Snake
+    snakeRadius: int = 550 
+    snakeThickness: int = 200
+    snakeNeck: int = 1100 # Starting at the center of the circle!
+    snakeCenTurnRad: int = 200 # CentralTurnRadius
+    snakeHorLineLen: int = 1400
+    snakeNumHooks: int = 4 # Number of full hooks. A hook is a 180 degree turn and a full line segment
+    snakeLayer: int = 12 # set to the same layer as resonator
+    snakeFinHorLineLen: int = 700 # len of the Final horiz line. Should be smaller then snake.HorLineLen!
+    snakeLength: float = 0 # centerline length from the edge of the pad to the open end, sets the two above (solveSnake), 0 keeps them
+    snakeMaxSize: tuple = () # (width, height) the solved snake has to fit in, () for no limit
+    # qubitLead           -- fine --======= corse EEEEEEEE
+    qubitLeadSizes: tuple = ((2, 20), (10, 100), (400, 800 )) # fine lead, coarse lead, main body
+    qubitCircLeadSizes: tuple =  ((2, 20), (10, 100))
+    qubitCircRadius: int = 200
+    qubitTestSize: int =                              80
+    qubitLeadGaps: tuple = (       10,        40          )
+    qubitLeadOverlap: float =       1.5      
+    qubitLeadLayers: tuple = (  11,            12          ) 
+    # discharger
+    dischargerRadius: int = 400 # seems to be defined as a circle, drawn between the specified angles with the qubit center as its center.
+    dischargerWidth: int = 4
+    dischargerAngles: tuple = (pi/2, -pi/2)
+    dischargerLayer: int = 12
+    # bridgeFreeJJ
+    bridgeFreeJJSizes: tuple = ((0.58, 0.9), (0.5, 0.9), (0.4, 0.7), (1.66, 0.1))
+    bridgeFreeJJLayers: tuple = (8, 10, 9, 7)
+    # border
+    borderWidth: float = 0.4 # tiny layer sheating every drawn geometry
+    borderLayer: int = 6
+    # elements of a die from top to bottom, see filledChip
+    chipStack: tuple = ('labels', 'markers', 'resonator', 'qubit', 'labels', 'testQubits', 'corners')
+    # vertical distances:      markerL - markerV - resonator - qubit - markerL - testQubit
+    # gap above every element of chipStack after the first, missing gaps repeat the last one
+    verticalDistances: tuple = (        6165,    12845,       800,    750,      685,       )
+    # horizontal distances:      marker - marker, testQubit - testQubit
+    horizontalDistances: tuple = (      3500,                415         )
+    # quantities
+    numTestQubits: int = 4
+    # design rules in um, checked by checkRules
+    drcMinWidth: tuple = ((6, 0.3), (7, 0.05), (8, 0.05), (9, 0.05), (10, 0.05), (11, 1), (12, 2), (13, 0.3)) # (layer, width)
+    drcMinSpacing: tuple = ((6, 0.3), (11, 1), (12, 2), (13, 0.3)) # (layer, spacing)
+    drcMinEnclosure: tuple = ((12, 1, 100),) # (inner layer, outer layer, distance)
+    # curves
+    curveTolerance: float = 10 # largest chord error of curved edges in nm, gdspy's default
+    curveTolerances: tuple = ((0, 25397), (12, 50)) # (layer, chord error in nm) for coarse layers, the fine layers keep curveTolerance, the wafer one is 1e-3 of waferRadius
+    # job files, one per exposure, written next to the full file with split=True, e.g. ChipAlice_fine.gds
+    # layers in no group (borders 6 and 13, wafer 0) are only in the full file
+    layerGroups: tuple = (('fine', (7, 8, 9, 10, 11)), ('coarse', (1, 12, 15))) # (name, layers)
+    # fracturing at the writefields (gridSize) with fracture=True
+    fieldKeepLayers: tuple = (7, 8, 9, 10) # the grid is shifted to keep these structures within one field, () keeps it in place
+    fieldKeepMargin: float = 1 # least distance of the kept structures to a field boundary
+    fieldMaxPoints: int = 8190 # most vertices per polygon, the limit of GDSII
+    fieldMaxPointsLayers: tuple = ((7, 199), (8, 199), (9, 199), (10, 199), (11, 199)) # (layer, most vertices) for the fine layers
+    # UNDER TEST
+    padRadius: int = 300
+
+    def __post_init__(self):
+        # frozen: the values are set with object.__setattr__, unchanged tuples are kept as they are
+        for field in dataclasses.fields(self):
+            object.__setattr__(self, field.name, freeze(getattr(self, field.name)))
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+def setItem(value, index, item):
+    # copy of the nested tuple value with value[index[0]][index[1]]... set to item, the other entries are shared
+    if len(index) == 0:
+        return freeze(item)
+    i = index[0]
+    return value[:i] + (setItem(value[i], index[1:], item),) + value[i+1:]
+
+# profiling
+# Opt-in: set the environment variable CHIP_PROFILE=1 (or to the name of a JSON file) or build inside "with profiling():".
+# Every profiled call adds its count, wall time and the vertices going in and out to the chain of profiled
+# calls it was made from, e.g. filledChip > qubit > splitBorder > offset. Switched off it costs one check per call.
+
+_profile = None # chain of callers -> [calls, seconds, vertices in, vertices out]
+_callers = []
+
+def vertexCount(value):
+    # vertices of the polygons in value, references are not counted
+    if isinstance(value, gdspy.PolygonSet):
+        return sum(map(len, value.polygons))
+    if isinstance(value, (list, tuple)):
+        return sum(map(vertexCount, value))
+    return 0
+def profiled(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _profile is None:
+            return function(*args, **kwargs)
+        _callers.append(function.__name__)
+        entry = _profile.setdefault(tuple(_callers), [0, 0.0, 0, 0])
+        verticesIn = vertexCount(args) + vertexCount(list(kwargs.values()))
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            _callers.pop()
+        entry[0] += 1
+        entry[1] += time.perf_counter() - start
+        entry[2] += verticesIn
+        entry[3] += vertexCount(result)
+        return result
+    return wrapper
+def profileReport(profile, filename=None):
+    """Print the profile as a tree of callers and callees, optionally dump it to a JSON file.
+
+    Args:
+        profile (dict): chain of callers -> [calls, seconds, vertices in, vertices out], e.g. from profiling()
+        filename (str, optional): JSON file to write the profile to. Defaults to None.
+    """
+    print('%-44s %7s %9s %11s %11s' % ('call', 'calls', 'seconds', 'vertices in', 'out'))
+    for path in sorted(profile):
+        calls, seconds, verticesIn, verticesOut = profile[path]
+        print('%-44s %7d %9.4f %11d %11d' % ('  '*(len(path)-1) + path[-1], calls, seconds, verticesIn, verticesOut))
+    if filename:
+        with open(filename, 'w') as f:
+            json.dump([{'path': list(path), 'calls': entry[0], 'seconds': entry[1], 'verticesIn': entry[2],
+                'verticesOut': entry[3]} for path, entry in sorted(profile.items())], f, indent=2)
+@contextlib.contextmanager
+def profiling(report=True, filename=None):
+    # profiles everything built inside the with block and prints the report at its end
+    global _profile
+    _profile = {}
+    try:
+        yield _profile
+    finally:
+        profile, _profile = _profile, None
+        if report:
+            profileReport(profile, filename)
+
+offset = profiled(gdspy.offset)
+boolean = profiled(gdspy.boolean)
+
+# placement
+# translate and rotate do not move the vertices. Every polygon set is wrapped once in a Placed set, which composes
+# all moves into one pending affine transform (x -> matrix @ x + offset). The vertices are moved the first time
+# anything reads them, which is everything in gdspy (booleans, offsets, export): placing a part costs O(1), and
+# bounding boxes of parts that are only translated or turned by multiples of 90 degrees come from moving the box.
+# Where the vertices of many parts are needed at once (cells, borders, export), realize moves all of them with one
+# array operation on a single vertex buffer instead of one gdspy call per polygon.
+
+class Placed(gdspy.PolygonSet):
+    """Polygon set that takes translations and rotations lazily.
+
+    Args:
+        a (PolygonSet): polygons to place, the vertex arrays are shared and never modified in place
+    """
+    def __init__(self, a):
+        if isinstance(a, Placed):
+            self._points, self._matrix, self._offset, self._box = list(a._points), a._matrix, a._offset, a._box
+        else:
+            self._points, self._matrix, self._offset, self._box = list(a.polygons), None, None, None
+        self.layers, self.datatypes, self.properties = list(a.layers), list(a.datatypes), dict(a.properties)
+    @property
+    def polygons(self):
+        if self._offset is not None:
+            matrix, offset = self._matrix, self._offset
+            self.polygons = [p + offset for p in self._points] if matrix is None else [p @ matrix.T + offset for p in self._points]
+        return self._points
+    @polygons.setter
+    def polygons(self, polygons):
+        # gdspy replaces the whole list on every change of the vertices
+        self._points, self._matrix, self._offset, self._box = polygons, None, None, None
+    def translate(self, dx, dy):
+        self._offset = np.array([dx, dy], dtype=float) + (0 if self._offset is None else self._offset)
+        return self
+    def rotate(self, angle, center=(0, 0)):
+        turn = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        center = np.asarray(center, dtype=float)
+        offset = np.zeros(2) if self._offset is None else self._offset
+        self._matrix = turn if self._matrix is None else turn @ self._matrix
+        self._offset = turn @ (offset - center) + center
+        return self
+    def boundingBox(self):
+        # box of the placed vertices, None if there are none
+        if not self._points:
+            return None
+        if self._matrix is not None and np.count_nonzero(abs(self._matrix) > 1e-12) != 2:
+            self.polygons # turned by an odd angle, the vertices are needed
+        if self._box is None:
+            points = np.concatenate(self._points)
+            self._box = np.array([points.min(axis=0), points.max(axis=0)])
+        if self._offset is None:
+            return self._box
+        corners = np.array([self._box[0], [self._box[1][0], self._box[0][1]], self._box[1], [self._box[0][0], self._box[1][1]]])
+        corners = (corners if self._matrix is None else corners @ self._matrix.T) + self._offset
+        return np.array([corners.min(axis=0), corners.max(axis=0)])
+def realize(parts):
+    """Apply the pending transforms of all Placed parts with one array operation.
+
+    The vertices of all parts are concatenated into one buffer and every vertex is moved by the transform of its
+    part. The polygons of every part become views into the moved buffer.
+
+    Args:
+        parts (list): parts of any kind, only Placed ones with a pending transform are moved
+
+    Returns:
+        list: parts
+    """
+    pending = [a for a in parts if isinstance(a, Placed) and a._offset is not None and a._points]
+    if not pending:
+        return parts
+    polygons = [p for a in pending for p in a._points]
+    counts = np.array([len(p) for p in polygons])
+    polygonsPerPart = [len(a._points) for a in pending]
+    verticesPerPart = np.add.reduceat(counts, np.cumsum([0] + polygonsPerPart[:-1]))
+    points = np.concatenate(polygons, dtype=float)
+    # the transform of every part repeated for each of its vertices
+    if any(a._matrix is not None for a in pending):
+        matrices = np.array([np.eye(2) if a._matrix is None else a._matrix for a in pending]).reshape(-1, 4)
+        matrix = np.repeat(matrices, verticesPerPart, axis=0)
+        x, y = points[:, 0].copy(), points[:, 1]
+        points[:, 0] = matrix[:, 0] * x + matrix[:, 1] * y
+        points[:, 1] = matrix[:, 2] * x + matrix[:, 3] * y
+    points += np.repeat(np.array([a._offset for a in pending]), verticesPerPart, axis=0)
+    ends = np.cumsum(counts).tolist()
+    views = [points[start:end] for start, end in zip([0] + ends[:-1], ends)]
+    start = 0
+    for a, n in zip(pending, polygonsPerPart):
+        a.polygons = views[start:start + n]
+        start += n
+    return parts
 
 # operations
 
+@profiled
 def join(parts): 
     layer = parts[0].layers[0] if isinstance(parts, list) else parts.layers[0]
     return gdspy.boolean(parts,None,'or', layer=layer, max_points=10000)
+@profiled
 def cut(a,b): return gdspy.boolean(a,b,'not', layer=a.layers[0], max_points=10000)
-def translate(parts, dx, dy): return [a.translate(dx, dy) for a in parts]
-def rotate(parts, angle, center): return [a.rotate(angle, center) for a in parts]
+def place(a):
+    # polygon sets are wrapped in Placed once, references move their origin which costs O(1) already
+    return Placed(a) if isinstance(a, gdspy.PolygonSet) and not isinstance(a, Placed) else a
+def translate(parts, dx, dy): 
+    # the moved parts, use the returned list: polygon sets are replaced by Placed ones
+    return [place(a).translate(dx, dy) for a in parts]
+def rotate(parts, angle, center): return [place(a).rotate(angle, center) for a in parts]
 def moveToOrigin(parts):
-    point1, point2 = join(parts).get_bounding_box()
+    point1, point2 = getBoundingBox(parts)
     dx, dy = -(point1 + point2)/2
     return translate(parts, dx,dy)
 
+@profiled
 def makeBorder(conf: DefaultConfig, parts): 
     # working principle: take an object, expand it, cut the original object from the expanded one and return the result as border.
-    return cut(gdspy.offset(parts, conf.borderWidth, layer=conf.borderLayer), parts)
+    if len(parts) == 1 and isinstance(parts[0], gdspy.CellReference):
+        # a component placed by reference gets a reference to its border cell
+        return reference(parts[0], borderCell(conf, parts[0].ref_cell))
+    return cut(offset(parts, conf.borderWidth, layer=conf.borderLayer), parts)
+@profiled
+def makeBorders(conf: DefaultConfig, groups):
+    # borders of many groups of parts with one offset and one cut per layer instead of one per group.
+    # Gives the same as makeBorder for every group, as long as the groups are further apart than twice the border width.
+    borders, layers = [], {}
+    realize([a for parts in groups for a in parts])
+    for parts in groups:
+        if len(parts) == 1 and isinstance(parts[0], gdspy.CellReference):
+            borders.append(makeBorder(conf, parts))
+            continue
+        for a in parts:
+            if len(a.polygons) > 0:
+                layers.setdefault(a.layers[0], []).append(a)
+    return borders + [makeBorder(conf, parts) for parts in layers.values()]
+@profiled
+def splitBorder(conf: DefaultConfig, coarse, fine, gap, layers):
+    """Border of the merged coarse and fine lead, split into the border along the coarse lead and the rest.
+
+    The merged lead is offset once. Everything of that border within borderWidth of the coarse lead goes to the
+    coarse layer, the remainder to the fine layer. This is the same split as bordering both leads on their own and
+    masking them with the border of the merged lead, with a third of the boolean operations.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+        coarse (list): coarse lead parts
+        fine (list): fine lead parts
+        gap (list): parts to keep free of border, e.g. the region of the junction
+        layers (list[int, int]): layers of the coarse and of the fine lead border
+
+    Returns:
+        list[polygon, polygon]: the coarse and the fine lead border
+    """
+    lead = coarse + fine
+    border = boolean(offset(lead, conf.borderWidth), lead + gap, 'not', max_points=10000)
+    coarseRegion = offset(coarse, conf.borderWidth)
+    return [boolean(border, coarseRegion, 'and', layer=layers[0]), boolean(border, coarseRegion, 'not', layer=layers[1])]
 def makeChip(conf: DefaultConfig, parts):
     padding = conf.chipPadding
-    point1, point2 = join(parts).get_bounding_box()
+    point1, point2 = getBoundingBox(parts)
     return gdspy.Rectangle(point1 - padding, point2 + padding, layer=conf.chipLayer) 
-def makeGrid(conf: DefaultConfig, parts):
+def onWafer(conf: DefaultConfig, centers, size):
+    # which of the rectangles around centers overlap the sliced wafer: the exact circle of waferRadius cut at
+    # waferSliceAt, not the polygon drawn by wafer(), whose chords lie up to its curve tolerance inside the circle
+    x0, y0 = (centers - np.array(size)/2).T
+    x1, y1 = (centers + np.array(size)/2).T
+    x0 = np.maximum(x0, conf.waferSliceAt)
+    nearestX = np.clip(0, x0, x1)
+    nearestY = np.clip(0, y0, y1)
+    return (x1 > x0) & (nearestX**2 + nearestY**2 < conf.waferRadius**2)
+def offWafer(conf: DefaultConfig, boxes):
+    # which of the boxes reach over the edge or the cut of the wafer
+    farthest = np.abs(boxes).max(axis=1) # corner farthest from the center
+    return (boxes[:, 0, 0] < conf.waferSliceAt) | ((farthest**2).sum(axis=1) > conf.waferRadius**2)
+def warnOffWafer(conf: DefaultConfig, boxes, names):
+    # the dies are built anyway, a sweep too large for the wafer still shows up in the preview
+    off = [name for name, isOff in zip(names, offWafer(conf, np.asarray(boxes))) if isOff]
+    if off:
+        print('%d of %d dies are not on the wafer: %s' % (len(off), len(names), ', '.join(off[:10]) + (', ...' if len(off) > 10 else '')))
+@profiled
+def makeGrid(conf: DefaultConfig, parts, hierarchical=False, shift=(0, 0)):
+    # writefields covering the parts, fields that are not on the wafer are left out
+    # the field in the middle is centered on the origin moved by shift, see fieldShift
     dX, dY = getSize(parts) / 2
     dx, dy = conf.gridSize
     layer = conf.gridLayer
-    numX, numY = int(np.ceil(dX/dx)), int(np.ceil(dY/dy))
-    rectangles = []
-    for i in range(-numX, numX+1):
-        for j in range(-numY, numY+1):
-            rectangles.append(myRectangle([dx,dy], layer, [i*dx, j*dy]))
+    numX, numY = int(np.ceil((dX + abs(shift[0]))/dx)), int(np.ceil((dY + abs(shift[1]))/dy))
+    i, j = np.meshgrid(np.arange(-numX, numX+1), np.arange(-numY, numY+1), indexing='ij')
+    centers = np.stack([i*dx + shift[0], j*dy + shift[1]], axis=-1)
+    inside = onWafer(conf, centers.reshape(-1, 2), [dx, dy]).reshape(i.shape)
+    if hierarchical:
+        # one array of references to a single field cell per row, the fields of a row on the wafer are contiguous
+        key = ('field', dx, dy, layer)
+        field = _cells.lookup(key) or _cells.store(key, makeCell(cellName('field', key), [myRectangle([dx,dy], layer)]))
+        rows = np.flatnonzero(inside.any(axis=0))
+        first = inside[:, rows].argmax(axis=0)
+        count = inside[:, rows].sum(axis=0)
+        fields = [gdspy.CellArray(field, n, 1, [dx, dy], centers[k, row]) for row, k, n in zip(rows, first, count)]
+    else:
+        # one polygon set holding all fields, built from a single vertex array
+        corners = np.array([[1, 1], [1, -1], [-1, -1], [-1, 1]]) * [dx/2, dy/2]
+        fields = [gdspy.PolygonSet(centers[inside][:, None, :] + corners, layer=layer)]
+    # rounded, otherwise float noise of the placement shows up in the text
     texts = [
-        gdspy.Text('Extent %s'     % str([dX, dY]), dy, [-numX*dx, numY*dy + dy*2], layer=layer),
+        gdspy.Text('Extent %s'     % str([round(dX, 6), round(dY, 6)]), dy, [-numX*dx, numY*dy + dy*2], layer=layer),
         gdspy.Text('Field Size %s' % str([dx, dy]), dy, [-numX*dx, numY*dy + dy], layer=layer),
     ]
-    return rectangles + texts
-def makeFile(filename, parts):
+    return fields + texts
+def showFile(filename):
+    # opens the gdspy LayoutViewer on a written file in its own process, so the build does not wait for the window
+    script = 'import sys, gdspy; gdspy.LayoutViewer(gdspy.GdsLibrary(infile=sys.argv[1]))'
+    return subprocess.Popen([sys.executable, '-c', script, filename])
+def selectLayers(parts, layers, cells):
+    # the polygons of parts on the given layers, references point to copies of their cells holding only those layers.
+    # cells: name -> selected copy or None if it has none of the layers, shared by all parts of one file
+    selected = []
+    for a in parts:
+        if hasattr(a, 'to_polygonset'):
+            a = a.to_polygonset()
+        if hasattr(a, 'polygons'):
+            keep = [k for k, layer in enumerate(a.layers) if layer in layers]
+            if keep:
+                b = gdspy.PolygonSet([a.polygons[k] for k in keep])
+                b.layers, b.datatypes = [a.layers[k] for k in keep], [a.datatypes[k] for k in keep]
+                selected.append(b)
+        elif isinstance(a.ref_cell, str): # placed by name (streamWafer), the cell was selected when it was written
+            if cells.get(a.ref_cell) is not None:
+                selected.append(a)
+        elif selectCell(a.ref_cell, layers, cells) is not None:
+            b = pycopy.copy(a)
+            b.ref_cell = cells[a.ref_cell.name]
+            selected.append(b)
+    return selected
+def selectCell(cell, layers, cells):
+    # copy of cell with the same name holding only the given layers, None if there are none
+    if cell.name not in cells:
+        parts = selectLayers(cell.polygons + cell.paths + cell.references, layers, cells)
+        cells[cell.name] = makeCell(cell.name, parts) if parts else None
+    return cells[cell.name]
+def groupFilename(filename, group):
+    root, extension = os.path.splitext(filename)
+    return '%s_%s%s' % (root, group, extension)
+def writeLibrary(filename, parts):
     lib = gdspy.GdsLibrary()
-    cell = lib.new_cell('cell')
-    cell.add(parts)
+    # kept out of gdspy's current library, several files are written in one process
+    cell = makeCell('cell', parts)
     cell.add(gdspy.Label('origin', [0,0]))
+    lib.add(cell, include_dependencies=False)
+    # cells placed by reference, a cell evicted from the cache and redrawn (or built in another worker) has the same
+    # name and geometry
+    lib.add(cell.get_dependencies(True), overwrite_duplicate=True)
     lib.write_gds(filename)
-    gdspy.LayoutViewer()
+@profiled
+def makeFile(filename, parts, preview=False, layerGroups=(), processes=None, pool=None):
+    """Write parts to a GDS file and optionally one job file per layer group next to it.
+
+    The job files only hold the polygons and cells on the layers of their group and are written in parallel,
+    e.g. ChipAlice_fine.gds and ChipAlice_coarse.gds for the layerGroups of the config.
+
+    Args:
+        filename (str): name of the GDS file
+        parts (list): polygons and references of the top cell
+        preview (bool, optional): Open the file in the LayoutViewer once it is written. Defaults to False.
+        layerGroups (list, optional): (name, layers) of every job file. Defaults to ().
+        processes (int, optional): Number of worker processes for the job files. Defaults to the number of cores.
+        pool (Executor, optional): Existing pool to reuse, overrides processes. Defaults to None.
+    """
+    writeLibrary(filename, parts)
+    jobs = [(groupFilename(filename, group), selectLayers(parts, set(layers), {})) for group, layers in layerGroups]
+    parallelMap(writeLibrary, jobs, processes, pool)
+    if preview:
+        showFile(filename)
+@profiled
+def streamWafer(conf: DefaultConfig, filename, chips, hierarchical=False, preview=False, layerGroups=(), positions=None,
+        dieNames=None):
+    """Write the dies with grid and wafer to a file, every die as soon as it is built.
+
+    Every die is written as a cell and dropped, only its bounding box is kept. The dies are placed at their
+    positions like in buildWafer and centered on the wafer by references from the top cell. Peak memory
+    is set by the largest die instead of the whole wafer.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+        filename (str): name of the GDS file
+        chips (iterable): the dies in their own coordinates, e.g. parallelIter(filledChip, jobs)
+        hierarchical (bool, optional): Draw the grid with cell arrays. Defaults to False.
+        preview (bool, optional): Open the file in the LayoutViewer once it is written. Defaults to False.
+        layerGroups (list, optional): (name, layers) of the job files written alongside, see makeFile. Defaults to ().
+        positions (array, optional): [column, row] of every die, see diePositions. Defaults to a single row.
+        dieNames (list, optional): names of the dies in the report of dies off the wafer, e.g. the first texts of the
+            jobs. Defaults to the names of their cells.
+    """
+    writer = gdspy.GdsWriter(filename)
+    # the job files are written along with the full file, every one from its own selected copies of the cells
+    groups = [(gdspy.GdsWriter(groupFilename(filename, group)), set(layers), {}) for group, layers in layerGroups]
+    written = set()
+    def write(cells):
+        for cell in cells:
+            if cell.name not in written:
+                written.add(cell.name)
+                writer.write_cell(cell)
+                for groupWriter, layers, selected in groups:
+                    if selectCell(cell, layers, selected) is not None:
+                        groupWriter.write_cell(selected[cell.name])
+    names, boxes = [], []
+    for i, chip in enumerate(chips):
+        isReference = len(chip) == 1 and isinstance(chip[0], gdspy.CellReference)
+        cell = chip[0].ref_cell if isReference else makeCell('chip%d' % (i+1), chip)
+        write(cell.get_dependencies(True))
+        write([cell])
+        names.append(cell.name)
+        boxes.append(getBoundingBox(chip))
+    # same arrangement as in buildWafer: dies spaced by the size of the first one, centered on the origin
+    boxes = np.array(boxes)
+    size = boxes[0, 1] - boxes[0, 0]
+    if positions is None:
+        positions = np.stack([np.arange(len(boxes)), np.zeros(len(boxes), dtype=int)], axis=1)
+    origins = dieOrigins(conf, size, positions)
+    point1, point2 = (boxes + origins[:, None, :])[:, 0].min(axis=0), (boxes + origins[:, None, :])[:, 1].max(axis=0)
+    origins -= (point1 + point2) / 2
+    dies = [gdspy.CellReference(name, origin, ignore_missing=True) for name, origin in zip(names, origins)]
+    warnOffWafer(conf, boxes + origins[:, None, :], dieNames or names)
+    extent = [gdspy.Rectangle((point1 - point2) / 2, (point2 - point1) / 2)] # the grid only needs the extent of the dies
+    top = makeCell('cell', dies + makeGrid(conf, extent, hierarchical) + wafer(conf))
+    top.add(gdspy.Label('origin', [0,0]))
+    write(top.get_dependencies(True))
+    write([top])
+    writer.close()
+    for groupWriter, layers, selected in groups:
+        groupWriter.close()
+    if preview:
+        showFile(filename)
 
 # calculations
+# The bounding box of a part is one vectorized min/max over all of its vertices. Placed parts keep it with their
+# vertices (Placed.boundingBox), so it goes away with the part and moves along with it. gdspy's own polygon sets
+# have __slots__ and get no cached box, the builders hand out Placed copies of their memoized parts (cheapCopy).
 
+def partBox(a):
+    if isinstance(a, Placed):
+        return a.boundingBox()
+    if not hasattr(a, 'polygons'):
+        return a.get_bounding_box() # references: gdspy caches the box of the referenced cell
+    if len(a.polygons) == 0:
+        return None
+    points = np.concatenate(a.polygons)
+    return np.array([points.min(axis=0), points.max(axis=0)])
+def getBoundingBox(parts):
+    # works for polygons as well as cell references, empty parts (like an empty text) are skipped
+    boxes = np.array([box for box in map(partBox, parts) if box is not None])
+    return np.array([boxes[:,0].min(axis=0), boxes[:,1].max(axis=0)])
 def getSize(parts): 
-    points = join(parts).get_bounding_box()
+    points = getBoundingBox(parts)
     return points[1] - points[0]
 
+# components
+# Builders are memoized on the config fields they read: a sweep only rebuilds the geometry that differs.
+# In hierarchical mode every component is drawn once into a gdspy.Cell and placed by reference.
+# Cells are shared between all dies whose config agrees on the fields the builder reads.
+
+class LRUCache(OrderedDict):
+    # dictionary that drops the least recently used entry once it holds more than maxsize entries
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+    def lookup(self, key):
+        if key not in self:
+            return None
+        self.move_to_end(key)
+        return self[key]
+    def store(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+        return value
+
+_parts = LRUCache(256)
+_cells = LRUCache(1024)
+
+def clearCaches():
+    # forgets all built components and cells, e.g. to time a cold build
+    _parts.clear()
+    _cells.clear()
+
+def dependsOn(*fields):
+    # records the config fields a builder reads and memoizes the builder on them
+    def decorate(builder):
+        build = profiled(builder)
+        @functools.wraps(builder)
+        def memoized(conf, *args, **kwargs):
+            key = componentKey(conf, memoized, *args, **kwargs)
+            parts = _parts.lookup(key)
+            if parts is None:
+                built = build(conf, *args, **kwargs)
+                parts = _parts.store(key, type(built)(map(place, built)))
+                for a in parts: # the copies share the box
+                    partBox(a)
+            return type(parts)(map(cheapCopy, parts))
+        memoized.fields = fields
+        return memoized
+    return decorate
+def cheapCopy(a):
+    # new polygon lists sharing the vertex arrays and the bounding box, gdspy transformations never modify them in place
+    if isinstance(a, gdspy.PolygonSet):
+        return Placed(a)
+    b = pycopy.copy(a)
+    b.polygons, b.layers, b.datatypes, b.properties = list(a.polygons), list(a.layers), list(a.datatypes), dict(a.properties)
+    return b
+def freeze(value):
+    # lists and arrays become tuples, tuples that are frozen already are kept to share them between configs
+    if isinstance(value, (list, tuple, np.ndarray)):
+        items = tuple(freeze(v) for v in value)
+        return value if isinstance(value, tuple) and all(a is b for a, b in zip(items, value)) else items
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+def componentKey(conf: DefaultConfig, builder, *args, **kwargs):
+    fields = tuple(getattr(conf, field) for field in builder.fields)
+    return (builder.__name__, fields, freeze(args), tuple(sorted(kwargs.items())))
+def cellName(name, key):
+    return '%s_%s' % (name, hashlib.sha1(repr(key).encode()).hexdigest()[:8])
+def makeCell(name, parts):
+    cell = gdspy.Cell(name, exclude_from_current=True)
+    cell.add(realize(parts))
+    return cell
+def componentCell(conf: DefaultConfig, builder, *args, **kwargs):
+    key = componentKey(conf, builder, *args, **kwargs)
+    cell = _cells.lookup(key)
+    if cell is None:
+        cell = _cells.store(key, makeCell(cellName(builder.__name__, key), builder(conf, *args, **kwargs)))
+    return cell
+def borderCell(conf: DefaultConfig, cell):
+    key = ('border', cell.name, conf.borderWidth, conf.borderLayer)
+    border = _cells.lookup(key)
+    if border is None:
+        border = _cells.store(key, makeCell(cellName('border', key), [makeBorder(conf, cell.get_polygonsets())]))
+    return border
+def component(conf: DefaultConfig, builder, *args, hierarchical=False, **kwargs):
+    """Build a component as a list of parts.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+        builder (function): component builder decorated with dependsOn, called as builder(conf, *args, **kwargs)
+        hierarchical (bool, optional): Return a single reference to a shared cell instead of the polygons. Defaults to False.
+
+    Returns:
+        list: the parts of the component
+    """
+    if hierarchical:
+        return [gdspy.CellReference(componentCell(conf, builder, *args, **kwargs))]
+    return builder(conf, *args, **kwargs)
+def reference(ref, cell=None):
+    # new reference placed like ref, to the same or to another cell
+    return gdspy.CellReference(cell or ref.ref_cell, ref.origin, ref.rotation, ref.magnification, ref.x_reflection)
+def duplicate(parts):
+    # independent parts sharing the vertex arrays (see Placed), references keep pointing to the same cell
+    return [reference(a) if isinstance(a, gdspy.CellReference) else Placed(a) for a in parts]
+
+# parallel
+# Dies are independent of each other and can be built in worker processes.
+
+def callWith(function, kwargs, args):
+    return function(*args, **kwargs)
+def parallelIter(function, jobs, processes=None, pool=None, chunksize=1, **kwargs):
+    # like parallelMap, but yields every result as soon as it and the ones before it are done
+    # a worker builds chunksize neighbouring jobs in a row, see sweepChunksize
+    jobs = list(jobs)
+    call = functools.partial(callWith, function, kwargs)
+    if pool is not None:
+        yield from pool.map(call, jobs, chunksize=chunksize)
+        return
+    processes = min(processes or os.cpu_count(), len(jobs))
+    if processes <= 1:
+        yield from map(call, jobs)
+        return
+    with ProcessPoolExecutor(processes) as pool:
+        yield from pool.map(call, jobs, chunksize=chunksize)
+def parallelMap(function, jobs, processes=None, pool=None, **kwargs):
+    """Call function(*job, **kwargs) for every job and return the results in the order of the jobs.
+
+    Args:
+        function (function): module level function, e.g. filledChip
+        jobs (list): argument tuples, e.g. [(conf, texts), ...]
+        processes (int, optional): Number of worker processes, 1 builds everything in this process. Defaults to the number of cores.
+        pool (Executor, optional): Existing pool to reuse, overrides processes. Defaults to None.
+
+    Returns:
+        list: the results of every job
+    """
+    return list(parallelIter(function, jobs, processes, pool, **kwargs))
+
+def mapJobs(function, jobs):
+    return [function(*job) for job in jobs]
+def tiledMap(function, jobs, processes=None, pool=None):
+    # parallelMap for many small jobs like tiles: a few batches of jobs per process instead of a task per job
+    # an existing pool is reused, processes then only sets the number of batches
+    processes = min(processes or os.cpu_count(), max(len(jobs), 1))
+    batches = processes * 4
+    results = [None] * len(jobs)
+    for k, batch in enumerate(parallelIter(mapJobs, [(function, jobs[k::batches]) for k in range(batches)], processes, pool)):
+        results[k::batches] = batch
+    return results
+
+# disk cache
+# Built dies are kept on disk under a hash of their config, their arguments and the source of the library
+# and of the script that builds them. A rerun only builds the dies that changed.
+# Polygons are stored as one vertex array per die, references (hierarchical mode) are pickled with their cells.
+
+cacheDirectory = os.environ.get('CHIP_CACHE', '.chipcache')
+maxCacheBytes = 512 * 2**20 # the least recently used entries are deleted above this size
+
+def sourceHash(*modules):
+    sha = hashlib.sha1()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+def cacheKey(function, *args, **kwargs):
+    version = sourceHash(sys.modules[__name__], sys.modules[function.__module__])
+    key = (function.__module__, function.__name__, freeze(args), tuple(sorted(kwargs.items())), version)
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+def packParts(parts):
+    polygonsets = [a for a in realize(parts) if hasattr(a, 'polygons')]
+    polygons = [p for a in polygonsets for p in a.polygons]
+    return {
+        'points': np.concatenate(polygons) if polygons else np.zeros((0, 2)),
+        'offsets': np.cumsum([0] + [len(p) for p in polygons]),
+        'layers': np.array([l for a in polygonsets for l in a.layers], dtype=int),
+        'datatypes': np.array([d for a in polygonsets for d in a.datatypes], dtype=int),
+        'references': [a for a in parts if not hasattr(a, 'polygons')],
+    }
+def unpackParts(packed):
+    points, offsets = packed['points'], packed['offsets']
+    parts = []
+    if len(offsets) > 1:
+        polygonset = gdspy.PolygonSet([])
+        polygonset.polygons = np.split(points, offsets[1:-1])
+        polygonset.layers, polygonset.datatypes = packed['layers'].tolist(), packed['datatypes'].tolist()
+        parts.append(polygonset)
+    return parts + packed['references']
+def touchCached(key, directory=None):
+    # whether the entry is in the cache, it is marked as recently used so that storing other entries keeps it
+    try:
+        os.utime(os.path.join(directory or cacheDirectory, key + '.pkl'))
+    except OSError:
+        return False
+    return True
+def loadCached(key, directory=None):
+    filename = os.path.join(directory or cacheDirectory, key + '.pkl')
+    try:
+        with open(filename, 'rb') as f:
+            parts = unpackParts(pickle.load(f))
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    os.utime(filename) # marks the entry as recently used
+    return parts
+def storeCached(key, parts, directory=None):
+    directory = directory or cacheDirectory
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, key + '.pkl')
+    with open(filename + '.tmp', 'wb') as f:
+        pickle.dump(packParts(parts), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(filename + '.tmp', filename)
+    evictCache(directory)
+    return parts
+def evictCache(directory=None, maxbytes=None):
+    # deletes the least recently used entries until the cache is below maxbytes
+    directory = directory or cacheDirectory
+    maxbytes = maxCacheBytes if maxbytes is None else maxbytes
+    entries = [e for e in os.scandir(directory) if e.name.endswith('.pkl')]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    total = sum(e.stat().st_size for e in entries)
+    for e in entries:
+        if total <= maxbytes:
+            break
+        total -= e.stat().st_size
+        os.remove(e.path)
+def cachedIter(function, jobs, processes=None, pool=None, directory=None, chunksize=1, **kwargs):
+    # like parallelIter, but jobs found in the disk cache are loaded instead of built.
+    # A cached die is only loaded when it is its turn, so streaming holds one die at a time.
+    jobs = list(jobs)
+    keys = [cacheKey(function, *job, **kwargs) for job in jobs]
+    hits = [touchCached(key, directory) for key in keys]
+    misses = [job for job, hit in zip(jobs, hits) if not hit]
+    built = parallelIter(function, misses, processes, pool, chunksize, **kwargs) if misses else iter(())
+    for job, key, hit in zip(jobs, keys, hits):
+        parts = loadCached(key, directory) if hit else None
+        if parts is None: # a miss, or an entry that was damaged or deleted since: it is built here
+            parts = storeCached(key, next(built) if not hit else callWith(function, kwargs, job), directory)
+        yield parts
+def cachedMap(function, jobs, processes=None, pool=None, directory=None, **kwargs):
+    """Like parallelMap, but every result is also kept in the disk cache and only the jobs that are not
+    in the cache are built.
+
+    Args:
+        function (function): module level function returning a list of parts, e.g. filledChip
+        jobs (list): argument tuples, e.g. [(conf, texts), ...]
+        processes (int, optional): Number of worker processes for the jobs that are built. Defaults to the number of cores.
+        pool (Executor, optional): Existing pool to reuse, overrides processes. Defaults to None.
+        directory (str, optional): Cache directory. Defaults to cacheDirectory.
+
+    Returns:
+        list: the results of every job
+    """
+    return list(cachedIter(function, jobs, processes, pool, directory, **kwargs))
+
 # basic parts
 
+def curveTolerance(conf: DefaultConfig, layer):
+    # chord error in um for curves drawn on the layer
+    return dict(conf.curveTolerances).get(layer, conf.curveTolerance) / 1000
+def roundAngles(radius, tolerance, maxPoints=199):
+    # angles of the vertices of a full gdspy.Round on its circle. Above maxPoints gdspy draws the circle as slices
+    # from the center with number_of_points - 1 vertices on the circle each, 0 draws one polygon.
+    n = max(3, 1 + int(pi / np.arccos(1 - tolerance/radius) + 0.5))
+    pieces = 1 if maxPoints == 0 else math.ceil(n / maxPoints)
+    n //= pieces
+    if pieces == 1:
+        return np.arange(n) * 2*pi / n
+    bounds = np.linspace(0, 2*pi, pieces + 1)
+    return np.unique(np.concatenate([np.linspace(a, b, n - 1) for a, b in zip(bounds[:-1], bounds[1:])]) % (2*pi))
+def arcAngles(start, end, radius, tolerance, maxPoints=199):
+    # angles of the points on each side of gdspy.Path.arc, radius is the outer one (radius of the arc + half the width).
+    # Above maxPoints the arc is drawn in pieces, the ends of neighbouring pieces coincide.
+    n = max(6, 2 + 2*int(0.5*abs(end - start) / np.arccos(1 - tolerance/radius) + 0.5))
+    pieces = 1 if maxPoints == 0 else math.ceil(n / maxPoints)
+    n //= pieces
+    bounds = np.linspace(start, end, pieces + 1)
+    return np.concatenate([np.linspace(a, b, n - n//2)[1 if k else 0:] for k, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))])
+def offsetBox(points, distance, precision=1e-3):
+    """Bounding box of a polygon offset outwards like gdspy.offset(polygon, distance, join='miter').
+
+    Every edge is moved out by distance, the corners are the crossings of neighbouring moved edges. The box is
+    rounded to the grid gdspy.offset computes on.
+
+    Args:
+        points (array): vertices of the polygon in either orientation
+        distance (float): offset, e.g. the borderWidth
+        precision (float, optional): grid of gdspy.offset. Defaults to 1e-3.
+
+    Returns:
+        array: [[x0, y0], [x1, y1]]
+    """
+    points = np.asarray(points, dtype=float)
+    points = points[(points != np.roll(points, 1, axis=0)).any(axis=1)]
+    edges = np.roll(points, -1, axis=0) - points
+    normals = np.stack([edges[:, 1], -edges[:, 0]], axis=-1) / np.linalg.norm(edges, axis=1)[:, None]
+    if (points[:, 0] * np.roll(points[:, 1], -1) - np.roll(points[:, 0], -1) * points[:, 1]).sum() < 0:
+        normals = -normals # clockwise
+    before = np.roll(normals, 1, axis=0)
+    corners = points + distance * (before + normals) / (1 + (before * normals).sum(axis=1))[:, None]
+    return np.round(np.array([corners.min(axis=0), corners.max(axis=0)]) / precision) * precision
+def countVertices(parts):
+    polygons = [p for a in parts for p in (a.polygons if hasattr(a, 'polygons') else a.get_polygons())]
+    return len(polygons), sum(map(len, polygons))
+def vertexReport(conf: DefaultConfig, components=None):
+    """Print and return the number of polygons and vertices of every component.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+        components (dict, optional): name -> parts, e.g. {'qubit': qubit(conf, test=False, isCirc=True)}. Defaults to the builders of this module.
+
+    Returns:
+        dict: name -> (polygons, vertices)
+    """
+    if components is None:
+        components = {
+            'wafer': wafer(conf), 'markerL': markerL(conf), 'markerV': markerV(conf), 'resonator': resonator(conf),
+            'snake': snake(conf), 'qubitLead': list(qubitLead(conf, isCirc=True)), 'discharger': discharger(conf),
+            'bridgeFreeJJ': bridgeFreeJJ(conf),
+        }
+    report = {name: countVertices(parts) for name, parts in components.items()}
+    for name, (polygons, vertices) in report.items():
+        print('%-14s %6d polygons %8d vertices' % (name, polygons, vertices))
+    return report
+
 def myRectangle(size, layer=0, center=[0,0]):
     point1 = np.array(size) * 0.5
     return gdspy.Rectangle(point1, -point1, layer=layer).translate(*center)
@@ -130,14 +881,16 @@ def myRectangle(size, layer=0, center=[0,0]):
 # the following functions all returns a list of gdspy part
 # parts that appear once
 
+@dependsOn('waferRadius', 'waferSliceAt', 'waferLayer', 'curveTolerance', 'curveTolerances')
 def wafer(conf: DefaultConfig):
     circle = gdspy.Round([0,0], 1, layer=conf.waferLayer,
-        tolerance=1e-3).scale(conf.waferRadius)
+        tolerance=curveTolerance(conf, conf.waferLayer)/conf.waferRadius).scale(conf.waferRadius)
     wafer = gdspy.slice(circle, conf.waferSliceAt, 0)[1]
     return [wafer]
 
 # parts that appear many times
 
+@dependsOn('markerLSize', 'markerLWidth', 'markerLTextSize', 'markerLayer')
 def markerL(conf: DefaultConfig, text='', rotation=0):
     dx, w, ts = conf.markerLSize[0], conf.markerLWidth, conf.markerLTextSize
     markerL = gdspy.FlexPath([(0,-dx), (0,0), (dx, 0)], w, layer=conf.markerLayer).to_polygonset()
@@ -146,49 +899,148 @@ def markerL(conf: DefaultConfig, text='', rotation=0):
         text.translate(-dx, 0)
     return [markerL.rotate(rotation), text]
 
+@dependsOn('markerVSize', 'markerLayer')
 def markerV(conf: DefaultConfig, rotation=0):
     dx, dy = conf.markerVSize
     markerV = gdspy.Polygon([(0,0), (dx, -dy/2), (dx, dy/2)], layer=conf.markerLayer)
     return [markerV.rotate(rotation)]
 
+@dependsOn('resonatorSize', 'resonatorLayer')
 def resonator(conf: DefaultConfig):
     return [myRectangle(conf.resonatorSize, conf.resonatorLayer)]
 
-def snake(conf: DefaultConfig, direction = True):
-    SnakeHead = gdspy.Round([0,0],conf.snakeRadius, layer = conf.snakeLayer)
-    SnakeBody = gdspy.Path(conf.snakeThickness, (0, 0))
-    # create the neck, first turn and first horizontal line element
-    if direction:
-        SnakeBody.segment(conf.snakeNeck, "+y")
-    else:
-        SnakeBody.segment(conf.snakeNeck, "-y")
-        
-    SnakeBody.turn(conf.snakeCenTurnRad,"r")
-    SnakeBody.segment(conf.snakeHorLineLen/2-conf.snakeCenTurnRad)
-    
-    # create as many full hooks as specified in conf0 plus an additional final turn
-    if conf.snakeNumHooks%2 == 0: # if even
-        for i in range(math.ceil(conf.snakeNumHooks/2)):
-            SnakeBody.turn(conf.snakeCenTurnRad,"ll")
-            SnakeBody.segment(conf.snakeHorLineLen)
-            SnakeBody.turn(conf.snakeCenTurnRad,"rr")
-            SnakeBody.segment(conf.snakeHorLineLen)
-        SnakeBody.turn(conf.snakeCenTurnRad,"ll")
-    else: # if odd
-        SnakeBody.turn(conf.snakeCenTurnRad,"ll")
-        SnakeBody.segment(conf.snakeHorLineLen)
-        for i in range(math.ceil((conf.snakeNumHooks-1)/2)):
-            SnakeBody.turn(conf.snakeCenTurnRad,"rr")
-            SnakeBody.segment(conf.snakeHorLineLen)
-            SnakeBody.turn(conf.snakeCenTurnRad,"ll")    
-            SnakeBody.segment(conf.snakeHorLineLen)
-        SnakeBody.turn(conf.snakeCenTurnRad,"rr")        
-    # Final Horizontal line segment
-    SnakeBody.segment(conf.snakeFinHorLineLen)
-    
-    Snake = join([SnakeHead] + [SnakeBody])
-    return [Snake]
+def solveSnake(conf: DefaultConfig, length):
+    """Number of hooks and final line of the snake with the given centerline length.
+
+    Every hook adds a half turn and a full line, the final line takes the rest. The fewest hooks with a final
+    line of at most snakeHorLineLen are taken, no geometry is drawn.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables, snakeMaxSize limits width and height
+        length (float): centerline length from the edge of the pad to the open end, see snakeLength
+
+    Raises:
+        ValueError: if no number of hooks gives the length or the snake does not fit into snakeMaxSize
+
+    Returns:
+        (int, float): snakeNumHooks and snakeFinHorLineLen
+    """
+    c, h = conf.snakeCenTurnRad, conf.snakeHorLineLen
+    shortest = centerlineLength(conf, 0, 0) # neck, quarter turn, first half line and the last half turn
+    step = pi*c + h # one hook
+    hooks = max(0, math.ceil((length - shortest - h - 1e-3) / step)) # a final line 1 nm over snakeHorLineLen is fine
+    final = length - shortest - hooks*step
+    if -1e-3 < final < 0: # a final line of 0 comes out a little negative from rounding
+        final = 0
+    if final < 0 and length < shortest:
+        raise ValueError('no snake of %.3f um, the shortest one is %.3f um long' % (length, shortest))
+    if final < 0: # between the longest snake with one hook less and the shortest one with this many
+        raise ValueError('no snake of %.3f um: %d hooks give up to %.3f um, %d hooks at least %.3f um' % (length,
+            hooks - 1, shortest + (hooks - 1)*step + h, hooks, shortest + hooks*step))
+    if conf.snakeMaxSize:
+        size = snakeSize(conf, hooks, final)
+        if (size > np.array(conf.snakeMaxSize)).any():
+            raise ValueError('the snake of %.3f um (%d hooks) is %g x %g um, larger than snakeMaxSize' % (length, hooks, *size))
+    return hooks, final
+def snakeHooks(conf: DefaultConfig):
+    # snakeNumHooks and snakeFinHorLineLen, solved for snakeLength if it is set
+    if conf.snakeLength:
+        return solveSnake(conf, conf.snakeLength)
+    return conf.snakeNumHooks, conf.snakeFinHorLineLen
+def centerlineLength(conf: DefaultConfig, hooks, final):
+    # length of the centerline from the edge of the pad to the open end
+    c, h = conf.snakeCenTurnRad, conf.snakeHorLineLen
+    return conf.snakeNeck - conf.snakeRadius + pi*c/2 + h/2 - c + (hooks + 1)*pi*c + hooks*h + final
+def snakeLength(conf: DefaultConfig):
+    return centerlineLength(conf, *snakeHooks(conf))
+def snakeSize(conf: DefaultConfig, hooks, final):
+    # width and height of the snake as snakeOutline samples it, the height is the one of elementExtent
+    c, h, w, r = conf.snakeCenTurnRad, conf.snakeHorLineLen, conf.snakeThickness/2, conf.snakeRadius
+    tolerance = curveTolerance(conf, conf.snakeLayer)
+    pad = roundAngles(r, tolerance)
+    centers, start, end = snakeTurns(conf, hooks)
+    turns = np.cos(turnAngles(start[1:], end[1:], c + w, tolerance))
+    # the half turns bulge out by up to c + w on both sides once there is a hook, the final line ends inside of them
+    left = min(r*np.cos(pad).min(), -h/2 + (c + w)*turns[0].min())
+    right = max(r*np.cos(pad).max(), h/2 + (c + w)*turns[1].max() if hooks > 0 else -h/2 + final)
+    return np.array([right - left, r*np.sin(pad).max() + conf.snakeNeck + c + 2*c*(hooks + 1) + w])
+def snakeTurns(conf: DefaultConfig, hooks):
+    # centers, start and end angles of the turns of the centerline with the neck pointing down: the quarter turn
+    # to the left, then half turns alternating left and right, 2*snakeCenTurnRad apart
+    c, h, neck = conf.snakeCenTurnRad, conf.snakeHorLineLen, conf.snakeNeck
+    i = np.arange(1, hooks + 2)
+    odd = i % 2 == 1
+    centers = np.concatenate([[[-c, -neck]], np.stack([np.where(odd, -h/2, h/2), -neck - 2*c*i], axis=-1)])
+    start = np.concatenate([[0], np.full(hooks + 1, pi/2)])
+    end = np.concatenate([[-pi/2], np.where(odd, 3*pi/2, -pi/2)])
+    return centers, start, end
+def turnAngles(start, end, radius, tolerance):
+    # angles of the points of turns as gdspy.Path.arc places them on each side, one row per turn
+    points = max(6, 2 + 2*int(0.5*abs(end[0] - start[0]) / np.arccos(1 - tolerance/radius) + 0.5)) // 2
+    return start[:, None] + (end - start)[:, None] * np.linspace(0, 1, points)
+def snakeCenterline(conf: DefaultConfig, direction=True):
+    # points of the centerline from the center of the pad to the open end
+    hooks, final = snakeHooks(conf)
+    c, w = conf.snakeCenTurnRad, conf.snakeThickness/2
+    centers, start, end = snakeTurns(conf, hooks)
+    tolerance = curveTolerance(conf, conf.snakeLayer)
+    turns = [center + c * np.stack([np.cos(a), np.sin(a)], axis=-1) for center, a in
+        zip(centers, [*turnAngles(start[:1], end[:1], c + w, tolerance), *turnAngles(start[1:], end[1:], c + w, tolerance)])]
+    heading = 1 if hooks % 2 == 0 else -1 # the final line runs to the right after a left half turn
+    points = np.concatenate([[[0, 0]], *turns, [turns[-1][-1] + [heading*final, 0]]])
+    return points if not direction else -points
+def snakeOutline(conf: DefaultConfig, direction=True):
+    """Outline of the snake: the round pad and the meander as one polygon.
+
+    The meander is offset from the centerline turn by turn: every turn is an arc of radius snakeCenTurnRad -/+ half
+    the thickness on its inner and outer side, the lines in between are edges between the turns. The pad is
+    a circle cut open where the neck leaves it.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+        direction (bool, optional): True puts the pad at the bottom, False at the top. Defaults to True.
+
+    Returns:
+        array: the vertices
+    """
+    hooks, final = snakeHooks(conf)
+    c, w, r = conf.snakeCenTurnRad, conf.snakeThickness/2, conf.snakeRadius
+    tolerance = curveTolerance(conf, conf.snakeLayer)
+    centers, start, end = snakeTurns(conf, hooks)
+    angles = [*turnAngles(start[:1], end[:1], c + w, tolerance), *turnAngles(start[1:], end[1:], c + w, tolerance)]
+    # the left side is the inner one of left turns (counterclockwise) and the outer one of right turns
+    leftTurn = end > start
+    side = lambda radii: np.concatenate([center + radius * np.stack([np.cos(a), np.sin(a)], axis=-1)
+        for center, radius, a in zip(centers, radii, angles)])
+    left, right = side(np.where(leftTurn, c - w, c + w)), side(np.where(leftTurn, c + w, c - w))
+    heading = [1 if hooks % 2 == 0 else -1, 0]
+    # the pad, sampled like gdspy.Round, from where the left edge of the neck leaves it around to the right edge
+    t = roundAngles(r, tolerance)
+    n = len(t)
+    circle = r * np.stack([np.cos(t), np.sin(t)], axis=-1)
+    following = np.roll(circle, -1, axis=0)
+    def crossing(x):
+        # the edge of the circle crossing the vertical line x below the center and the point where it does
+        k = np.flatnonzero(((circle[:, 0] - x) * (following[:, 0] - x) <= 0) & (circle[:, 1] + following[:, 1] < 0)
+            & (circle[:, 0] != following[:, 0]))[0]
+        a, b = circle[k], following[k]
+        return k, a + (b - a) * (x - a[0]) / (b[0] - a[0])
+    (kLeft, pointLeft), (kRight, pointRight) = crossing(w), crossing(-w)
+    pad = circle[(kLeft + 1 + np.arange((kRight - kLeft) % n)) % n]
+    points = np.concatenate([[pointLeft], pad, [pointRight], right, [right[-1] + np.multiply(heading, final)],
+        [left[-1] + np.multiply(heading, final)], left[::-1]])
+    # lines of zero length leave repeated points
+    points = points[np.r_[True, (points[1:] != points[:-1]).any(axis=1)]]
+    return points if not direction else -points
+
+@dependsOn('snakeRadius', 'snakeThickness', 'snakeNeck', 'snakeCenTurnRad', 'snakeHorLineLen', 'snakeNumHooks',
+    'snakeLayer', 'snakeFinHorLineLen', 'snakeLength', 'snakeMaxSize', 'curveTolerance', 'curveTolerances')
+def snake(conf: DefaultConfig, direction = True): # True means pad at bottom, false, pad at top
+    # one polygon computed from the centerline, see snakeOutline
+    return [gdspy.Polygon(snakeOutline(conf, direction), layer=conf.snakeLayer)]
 
+@dependsOn('qubitLeadSizes', 'qubitCircLeadSizes', 'qubitCircRadius', 'qubitTestSize',
+    'qubitLeadGaps', 'qubitLeadOverlap', 'qubitLeadLayers', 'curveTolerance', 'curveTolerances')
 def qubitLead(conf: DefaultConfig, test = False, isCirc = False ):
     """Create the Qubit Pad, Coarse Lead and Fine Lead. The Pad and Coarse Lead are added together into Corse Lead.
 
@@ -209,12 +1061,12 @@ def qubitLead(conf: DefaultConfig, test = False, isCirc = False ):
     else: 
         sizes = conf.qubitLeadSizes
     if test: 
-        sizes = conf.qubitLeadSizes
-        sizes[2][1] = conf.qubitTestSize
+        sizes = setItem(conf.qubitLeadSizes, [2, 1], conf.qubitTestSize)
         
     gaps = conf.qubitLeadGaps
     layers = conf.qubitLeadLayers
-    curve = gdspy.Curve(0)
+    # the curve runs through both layers, the finer one decides
+    curve = gdspy.Curve(0, tolerance=min(curveTolerance(conf, layer) for layer in layers))
     # This part takes care of drawing out the fineLead, CoraseLead and if isCirc = False the pad.
     # The way it works is by drawing half the structure (vertical cut) and then mirroring it over.
     for i, size in enumerate(sizes):
@@ -232,17 +1084,21 @@ def qubitLead(conf: DefaultConfig, test = False, isCirc = False ):
     # Seperating the single gdspy object into coarse and fine lead
     slice1 = sizes[0][1]+gaps[0]
     slice2 = slice1 + conf.qubitLeadOverlap
-    coarseLead = gdspy.slice(lead, slice1, 1, layer=layers)[1]
-    fineLead   = gdspy.slice(lead, slice2, 1, layer=layers)[0]
+    coarseLead = gdspy.slice(lead, slice1, 1, layer=list(layers))[1]
+    fineLead   = gdspy.slice(lead, slice2, 1, layer=list(layers))[0]
     if isCirc and not test:
-        CirclePad = gdspy.Round(center=[0,sizes[0][1]+sizes[1][1]+radius+gaps[0]-conf.qubitLeadOverlap], radius=radius,layer=layers[1])
+        CirclePad = gdspy.Round(center=[0,sizes[0][1]+sizes[1][1]+radius+gaps[0]-conf.qubitLeadOverlap], radius=radius,layer=layers[1],
+            tolerance=curveTolerance(conf, layers[1]))
         coarseLead = join([coarseLead,CirclePad])   
     return coarseLead, fineLead
 
+@dependsOn('dischargerRadius', 'dischargerWidth', 'dischargerAngles', 'dischargerLayer', 'curveTolerance', 'curveTolerances')
 def discharger(conf: DefaultConfig):
     w, r, angles = conf.dischargerWidth, conf.dischargerRadius, conf.dischargerAngles
-    return [gdspy.Path(w, [0, r]).arc(r, *angles, layer=conf.dischargerLayer)]
+    tolerance = curveTolerance(conf, conf.dischargerLayer)
+    return [gdspy.Path(w, [0, r]).arc(r, *angles, layer=conf.dischargerLayer, tolerance=tolerance)]
 
+@dependsOn('bridgeFreeJJSizes', 'bridgeFreeJJLayers')
 def bridgeFreeJJ(conf: DefaultConfig):
     sizes = conf.bridgeFreeJJSizes
     layers = conf.bridgeFreeJJLayers
@@ -258,3 +1114,732 @@ def bridgeFreeJJ(conf: DefaultConfig):
     for i in range(3):
         rectangles.append(copy(rectangles[i]).rotate(pi))
     return rectangles
+
+# parts made of parts
+
+@dependsOn(*bridgeFreeJJ.fields, *qubitLead.fields, *discharger.fields, 'borderWidth', 'borderLayer')
+def qubit(conf: DefaultConfig, test, isCirc = False, cLlayer = 6, fLlayer = 13 ):
+    bridgeFreeJJ1 = bridgeFreeJJ(conf)
+    size1 = getSize(bridgeFreeJJ1)
+    
+    coarseLead1, fineLead1 = translate(qubitLead(conf, test, isCirc), 0, size1[1]/2)
+    coarseLead2, fineLead2 = rotate(duplicate([coarseLead1, fineLead1]), pi, [0,0])
+    discharger1 = [] if test else discharger(conf)
+    
+    joinedcoarseLead = [join([coarseLead1, coarseLead2] + discharger1)]
+    joinedfineLead = [fineLead1, fineLead2]
+    
+    # The border of the fineLead and of the CoarseLead go to different layers.
+    # The border of the joined leads is made once and split by the distance to the coarse lead.
+    junction = [myRectangle([size1[0]*10, size1[1]])]
+    borders = splitBorder(conf, joinedcoarseLead, joinedfineLead, junction, [cLlayer, fLlayer])
+    
+    joinedLead = joinedcoarseLead + joinedfineLead
+    return bridgeFreeJJ1 + joinedLead + borders
+
+# dies
+# A die is a column of elements (conf.chipStack) separated by conf.verticalDistances, with the markers
+# at +-horizontalDistances[0]/2.
+#   labels      markerL pair, the first one carries the texts of the die
+#   markers     markerV pair, the orientation alternates from row to row
+#   corners     markerL pair without text
+#   resonator, qubit, snake (pad at the top), testQubits (a row of numTestQubits test qubits)
+
+# The layout of a die is solved from the config alone, no geometry is built for it.
+
+def qubitBox(conf: DefaultConfig, test):
+    """Bounding box of qubit(conf, test, isCirc=True) including its border, as gdspy draws it.
+
+    The leads and the junction are rectangles (the lead curves stay within them). The round pads and the
+    discharger are sampled like gdspy.Round and gdspy.Path.arc sample them and bordered like splitBorder
+    offsets them, so the box is the one of the drawn polygons and not of the ideal circles.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+        test (bool): test qubit without pads and discharger
+
+    Returns:
+        array: [[x0, y0], [x1, y1]] around the center of the junction
+    """
+    jj, d = conf.bridgeFreeJJSizes, conf.borderWidth
+    jjWidth, jjHeight = max(w for w, h in jj), 2*jj[0][1] + jj[3][1]
+    gaps = conf.qubitLeadGaps
+    sizes = setItem(conf.qubitLeadSizes, [2, 1], conf.qubitTestSize) if test else conf.qubitCircLeadSizes
+    # the lead starts at the top of the junction, the lower one is the upper one turned by pi
+    top = jjHeight/2 + sum(h for w, h in sizes) + sum(gaps[:len(sizes)-1])
+    halfWidth = max(max(w for w, h in sizes), jjWidth) / 2
+    boxes = [np.array([[-halfWidth, -top], [halfWidth, top]]) + [[-d, -d], [d, d]]]
+    if not test:
+        # the circular pad overlaps with the coarse lead
+        radius = conf.qubitCircRadius
+        center = jjHeight/2 + sizes[0][1] + sizes[1][1] + radius + gaps[0] - conf.qubitLeadOverlap
+        angles = roundAngles(radius, curveTolerance(conf, conf.qubitLeadLayers[1]))
+        pad = offsetBox(np.stack([radius*np.cos(angles), center + radius*np.sin(angles)], axis=-1), d)
+        boxes += [pad, -pad[::-1]]
+        w, r, (start, end) = conf.dischargerWidth/2, conf.dischargerRadius, conf.dischargerAngles
+        angles = arcAngles(start, end, r + w, curveTolerance(conf, conf.dischargerLayer))
+        # the arc starts at [0, r], its center is r back along the start angle
+        center = np.array([0, r]) - r * np.array([np.cos(start), np.sin(start)])
+        side = lambda radius, a: center + radius * np.stack([np.cos(a), np.sin(a)], axis=-1)
+        boxes.append(offsetBox(np.concatenate([side(r + w, angles), side(r - w, angles[::-1])]), d))
+    boxes = np.array(boxes)
+    return np.array([boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)])
+def qubitExtent(conf: DefaultConfig, test):
+    # width and height of qubit(conf, test, isCirc=True) including its border
+    box = qubitBox(conf, test)
+    return box[1] - box[0]
+def elementExtent(conf: DefaultConfig, element):
+    # height of an element of chipStack and the distance from its top edge to its origin
+    if element in ('labels', 'corners', 'markers'):
+        return 0, 0
+    if element == 'resonator':
+        return conf.resonatorSize[1], conf.resonatorSize[1] / 2
+    if element in ('qubit', 'testQubits'):
+        box = qubitBox(conf, element == 'testQubits')
+        return box[1][1] - box[0][1], box[1][1]
+    if element == 'snake':
+        # neck, first quarter turn and a half turn per hook plus the final one, all below the pad
+        return snakeSize(conf, *snakeHooks(conf))[1], conf.snakeRadius
+    raise ValueError('unknown element %r in chipStack' % element)
+def stackLayout(conf: DefaultConfig):
+    """Positions of the elements of a die.
+
+    Every element is placed by its top edge: the gaps of verticalDistances lie between the bottom edge of an
+    element and the top edge of the next one. All positions are one cumulative sum over the extents. The extents
+    are those of the elements drawn with all curves at curveTolerance, the bounding boxes the dies were always
+    laid out with, so coarser curveTolerances on some layers do not move anything.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables
+
+    Returns:
+        (array, array): y of the origin of every element of chipStack (pointing downwards), x of the test qubits
+    """
+    stack, verDist = conf.chipStack, conf.verticalDistances
+    fine = conf.replace(curveTolerances=())
+    heights, aboves = np.array([elementExtent(fine, element) for element in stack], dtype=float).T
+    gaps = np.take(verDist, np.minimum(np.arange(len(stack) - 1), len(verDist) - 1))
+    tops = np.concatenate([[0], np.cumsum(heights[:-1] + gaps)])
+    width = qubitExtent(fine, True)[0]
+    xTestQubits = (width + conf.horizontalDistances[1]) * (np.arange(conf.numTestQubits) - (conf.numTestQubits-1)/2)
+    return tops + aboves, xTestQubits
+
+@profiled
+def filledChip(conf: DefaultConfig, texts, hierarchical=False):
+    # in hierarchical mode every element is a reference to a cell shared between all dies
+    make = lambda builder, **kwargs: component(conf, builder, hierarchical=hierarchical, **kwargs)
+    xMarker = conf.horizontalDistances[0] / 2
+    pair = lambda left, right: translate(left, -xMarker, 0) + translate(right, xMarker, 0)
+    yElements, xTestQubits = stackLayout(conf)
+    parts, bordered = [], []
+    markerRows = 0
+    for element, y in zip(conf.chipStack, yElements):
+        if element == 'labels':
+            group = pair(make(markerL, text=texts[0]), make(markerL, text=texts[1], rotation= -pi/2))
+        elif element == 'corners':
+            group = pair(make(markerL, rotation= pi/2), make(markerL, rotation= pi))
+        elif element == 'markers':
+            rotations = (0, pi) if markerRows % 2 == 0 else (pi, 0)
+            group = pair(make(markerV, rotation=rotations[0]), make(markerV, rotation=rotations[1]))
+            markerRows += 1
+        elif element == 'testQubits':
+            testQubit1 = make(qubit, test=True, isCirc=True)
+            group = []
+            for x in xTestQubits:
+                group += translate(duplicate(testQubit1), x, 0)
+        elif element == 'resonator':
+            group = make(resonator)
+        elif element == 'qubit':
+            group = make(qubit, test=False, isCirc = True)
+        elif element == 'snake':
+            group = make(snake, direction = False)
+        group = translate(group, 0, -y)
+        parts += group
+        # the qubits bring their own border
+        if element not in ('qubit', 'testQubits'):
+            bordered += [[a] for a in group]
+    borders = makeBorders(conf, bordered)
+    chip = parts + [makeChip(conf, parts)] + borders
+    return [gdspy.CellReference(makeCell('chip_' + texts[0], chip))] if hierarchical else chip
+
+# wafers
+# A wafer spec (JSON or TOML file) holds the name of the GDS file, the config overrides of the wafer and the
+# sweep over its dies, e.g. ChipAlice/ChipAlice.toml. A sweep combines any number of config fields and places
+# the variants on a grid of dies (sweepJobs). buildWafers builds several specs in one process and
+# shares the component caches, the disk cache and the worker pool between them.
+
+def loadSpec(filename):
+    with open(filename, 'rb') as f:
+        if filename.endswith('.toml'):
+            if tomllib is None:
+                raise ImportError('TOML wafer specs need python 3.11 or newer or the tomli package, or use a JSON spec')
+            spec = tomllib.load(f)
+        else:
+            spec = json.load(f)
+    # the GDS file is written next to the spec
+    spec['file'] = os.path.join(os.path.dirname(filename), spec['file'])
+    return spec
+def sweepFields(sweep):
+    # the swept fields of a sweep, a sweep over a single field may give it directly: field, index, linspace or values
+    fields = sweep.get('fields', [sweep] if 'field' in sweep else [])
+    if not fields:
+        raise ValueError('the sweep has no fields')
+    return fields
+def fieldValues(field):
+    return list(np.linspace(*field['linspace'])) if 'linspace' in field else list(field['values'])
+# label formats of commonly swept fields and entries, (field, index) -> format
+fieldLabels = {('bridgeFreeJJSizes', (3, 0)): 'W{:.2f}', ('bridgeFreeJJSizes', (3, 1)): 'L{:.2f}'}
+def fieldLabel(field, value):
+    # the label format of the field: its label, the one in fieldLabels (junction width -> W1.52), else the initials
+    # of its name (qubitCircRadius -> QCR300, dischargerRadius -> DR250)
+    index = field.get('index')
+    default = fieldLabels.get((field['field'], tuple(index) if index else None),
+        ''.join(c for k, c in enumerate(field['field']) if k == 0 or c.isupper()).upper() + '{:g}')
+    return field.get('label', default).format(value)
+def sweepVariants(sweep):
+    """The swept values of every die.
+
+    product = "cartesian" (default) combines every value of every field, the first field varies slowest.
+    product = "zip" takes the i-th value of every field, all fields need the same number of values.
+
+    Args:
+        sweep (dict): the sweep of a wafer spec, see sweepJobs
+
+    Returns:
+        list: a tuple holding the value of every field per die
+    """
+    values = [fieldValues(field) for field in sweepFields(sweep)]
+    product = sweep.get('product', 'cartesian')
+    if product == 'cartesian':
+        return list(itertools.product(*values))
+    if product == 'zip':
+        if len(set(map(len, values))) > 1:
+            raise ValueError('zipped fields need the same number of values, got %s' % [len(v) for v in values])
+        return list(zip(*values))
+    raise ValueError('unknown sweep product %r, use "cartesian" or "zip"' % product)
+def diePositions(sweep, count):
+    # [column, row] of every die counted from 0: given by positions, or rows of sweep['columns'] dies from the top
+    if 'positions' in sweep:
+        positions = np.array(sweep['positions'], dtype=int).reshape(-1, 2)
+        if len(positions) != count:
+            raise ValueError('%d positions for %d dies' % (len(positions), count))
+        if len(set(map(tuple, positions))) < count:
+            raise ValueError('two dies share a position')
+        return positions
+    columns = sweep.get('columns') or count
+    return np.stack([np.arange(count) % columns, np.arange(count) // columns], axis=1)
+def dieOrigins(conf: DefaultConfig, size, positions):
+    # origins of dies of the given size at [column, row] positions, rows go down and are spaced like the columns
+    return np.asarray(positions) * [size[0] + conf.chipMargin, -(size[1] + conf.chipMargin)]
+def sweepJobs(conf: DefaultConfig, sweep):
+    """One (conf, texts) job per die of a sweep.
+
+    Every swept field is set to its value of the die, index selects an entry of a nested field,
+    e.g. {field = "bridgeFreeJJSizes", index = [3, 0], linspace = [1.52, 1.66, 8]}. The texts of the labels
+    are formatted with column, row and die (counted from 1), value (of the first field), values and label
+    (the labels of all fields, a line each). They default to ["Col{die}", "{label}"]; the first one names the die.
+
+    Args:
+        conf (DefaultConfig): config of the wafer
+        sweep (dict): fields (or a single field), product, columns or positions and texts, see sweepVariants
+
+    Returns:
+        list: (conf, texts) of every die, in the order of diePositions
+    """
+    fields = sweepFields(sweep)
+    variants = sweepVariants(sweep)
+    positions = diePositions(sweep, len(variants))
+    jobs = []
+    for die, (values, (column, row)) in enumerate(zip(variants, positions)):
+        items = {}
+        for field, value in zip(fields, values):
+            name, index = field['field'], field.get('index')
+            # several entries of one nested field can be swept, e.g. the width and the length of a junction
+            items[name] = setItem(items.get(name, getattr(conf, name)), index, value) if index else value
+        label = '\n'.join(fieldLabel(field, value) for field, value in zip(fields, values)) # a line per field
+        texts = [text.format(column=column+1, row=row+1, die=die+1, value=values[0], values=values, label=label)
+            for text in sweep.get('texts', ['Col{die}', '{label}'])]
+        jobs.append( (conf.replace(**items), texts) )
+    names = [texts[0] for conf, texts in jobs]
+    if len(set(names)) < len(names):
+        raise ValueError('the first text names the die and has to differ between dies, e.g. "Col{die}"')
+    return jobs
+def sweepChunksize(jobs, processes=None):
+    # neighbouring dies share most components, a worker gets a few runs of them to reuse its memoized builders
+    processes = processes or os.cpu_count()
+    return max(1, len(jobs) // (processes * 4))
+def buildWafer(spec, hierarchical=False, processes=None, stream=False, preview=False, cache=True, pool=None, drc=False, split=False,
+        fracture=False):
+    """Build the wafer described by a spec and write it to spec['file'].
+
+    Args:
+        spec (dict): wafer spec, see loadSpec
+        hierarchical (bool, optional): Place the components by reference to shared cells. Defaults to False.
+        processes (int, optional): Number of worker processes, 1 builds everything in this process. Defaults to the number of cores.
+        stream (bool, optional): Write every die as soon as it is built (streamWafer). Defaults to False.
+        preview (bool, optional): Open the file in the LayoutViewer once it is written. Defaults to False.
+        cache (bool, optional): Load the dies from the disk cache when possible. Defaults to True.
+        pool (Executor, optional): Existing pool to reuse for the dies and the design rule check, overrides processes. Defaults to None.
+        drc (bool, optional): Check the design rules on the written file and print the violations. Defaults to False.
+        split (bool, optional): Write a job file per layer group of the config next to the file. Defaults to False.
+        fracture (bool, optional): Cut the polygons at the writefields (fractureParts), not with stream. Defaults to False.
+    """
+    if stream and fracture:
+        raise ValueError('fracturing needs the whole wafer in memory, it does not work with stream=True')
+    profile = os.environ.get('CHIP_PROFILE')
+    if profile and _profile is None:
+        with profiling(filename=profile if profile.endswith('.json') else None):
+            return buildWafer(spec, hierarchical, processes, stream, preview, cache, pool, drc, split, fracture)
+    if _profile is not None: # the dies are built in this process to show up in the profile
+        processes, pool = 1, None
+    conf0 = DefaultConfig().replace(**spec.get('config', {}))
+    jobs = sweepJobs(conf0, spec['sweep'])
+    positions = diePositions(spec['sweep'], len(jobs))
+    # the dies are built in parallel, processes=1 builds them one after the other in this process
+    # with cache=True dies that are in the disk cache are loaded instead
+    build = functools.partial(cachedIter if cache else parallelIter, chunksize=sweepChunksize(jobs, processes))
+    layerGroups = conf0.layerGroups if split else ()
+    if stream: # every die is written to the file as soon as it is built
+        chips = build(filledChip, jobs, processes, pool, hierarchical=hierarchical)
+        streamWafer(conf0, spec['file'], chips, hierarchical, preview, layerGroups, positions,
+            [texts[0] for conf, texts in jobs])
+    else:
+        chips = list(build(filledChip, jobs, processes, pool, hierarchical=hierarchical))
+        parts = []
+        size = getSize(chips[0])
+        boxes = []
+        for chip, (x, y) in zip(chips, dieOrigins(conf0, size, positions)):
+            chip = translate(chip, x, y)
+            boxes.append(getBoundingBox(chip))
+            parts += chip
+        center = getBoundingBox(parts).mean(axis=0)
+        warnOffWafer(conf0, np.array(boxes) - center, [texts[0] for conf, texts in jobs])
+        parts = moveToOrigin(parts)
+        shift = (0, 0)
+        if fracture: # the grid is placed first, the polygons are then cut at its fields
+            shift = fieldShift(conf0, parts)
+            parts = fractureParts(conf0, parts, shift)
+        grid = makeGrid(conf0, parts, hierarchical, shift)
+        makeFile(spec['file'], parts + grid + wafer(conf0), preview, layerGroups, processes, pool)
+    if drc: # the written file is checked, so stream and hierarchical builds are covered as well
+        print('design rules of %s:' % spec['file'])
+        printViolations(checkFile(conf0, spec['file'], processes=processes, pool=pool))
+def buildWafers(filenames, hierarchical=False, processes=None, stream=False, preview=False, cache=True, drc=False, split=False,
+        fracture=False):
+    # builds every spec in this process, the workers are started once for all of them
+    specs = [loadSpec(filename) for filename in filenames]
+    processes = processes or os.cpu_count()
+    if processes <= 1:
+        for spec in specs:
+            buildWafer(spec, hierarchical, 1, stream, preview, cache, drc=drc, split=split, fracture=fracture)
+        return
+    with ProcessPoolExecutor(processes) as pool:
+        for spec in specs:
+            buildWafer(spec, hierarchical, processes, stream, preview, cache, pool, drc, split, fracture)
+
+# verification
+# Two GDS files are compared layer by layer with a geometric XOR. The layout is cut into square tiles, every
+# polygon goes to the tiles its bounding box overlaps and the tiles are compared in parallel. Tiles holding the
+# same polygons in both files are skipped without a boolean operation.
+
+def readLayers(filename):
+    # (layer, datatype) -> polygons of all top level cells, rounded to the 1 nm grid of the file
+    layers = {}
+    for cell in gdspy.GdsLibrary(infile=filename).top_level():
+        for spec, polygons in cell.get_polygons(by_spec=True).items():
+            layers.setdefault(spec, []).extend(np.round(p, 3) for p in polygons)
+    return layers
+def polygonBoxes(polygons):
+    # bounding box of every polygon, shape (n, 2, 2)
+    if not polygons:
+        return np.zeros((0, 2, 2))
+    return np.array([[p.min(axis=0), p.max(axis=0)] for p in polygons])
+def tileIndex(boxes, tileSize):
+    # tile (i, j) covering [i, i+1] x [j, j+1] * tileSize -> indices of the boxes overlapping it
+    first, last = np.floor(boxes / tileSize).astype(int).transpose(1, 0, 2)
+    tiles = {}
+    single = (first == last).all(axis=1)
+    for k, tile in zip(np.flatnonzero(single), map(tuple, first[single])):
+        tiles.setdefault(tile, []).append(k)
+    for k in np.flatnonzero(~single):
+        for i in range(first[k, 0], last[k, 0] + 1):
+            for j in range(first[k, 1], last[k, 1] + 1):
+                tiles.setdefault((i, j), []).append(k)
+    return tiles
+def xorTile(a, b, box):
+    # area and bounding box of the difference of two lists of polygons within box
+    if len(a) == len(b) and all(np.array_equal(p, q) for p, q in zip(a, b)):
+        return 0.0, None
+    # both sides are clipped to the tile first, which also merges overlapping polygons of one side
+    tile = gdspy.Rectangle(*box)
+    a, b = [gdspy.boolean(polygons, tile, 'and', max_points=0) if polygons else None for polygons in (a, b)]
+    difference = gdspy.boolean(a, b, 'xor', max_points=0) if a and b else a or b
+    if difference is None:
+        return 0.0, None
+    return difference.area(), difference.get_bounding_box()
+def compareGds(filename, golden, tileSize=1000, processes=None, skip=(), minArea=1e-3, pool=None):
+    """Geometric XOR of two GDS files per layer.
+
+    Args:
+        filename (str): GDS file to check
+        golden (str): GDS file it should agree with
+        tileSize (float, optional): Edge length of the tiles in um. Defaults to 1000.
+        processes (int, optional): Number of worker processes, 1 compares in this process. Defaults to the number of cores.
+        skip (list, optional): Layers that are not compared. Defaults to ().
+        minArea (float, optional): Differences of a tile below this area in um^2 are not listed as locations. Defaults to 1e-3.
+        pool (Executor, optional): Existing pool to reuse, overrides processes. Defaults to None.
+
+    Returns:
+        dict: (layer, datatype) -> {'area': differing area, 'locations': [(area, bounding box), ...] largest first}
+    """
+    a, b = readLayers(filename), readLayers(golden)
+    specs, jobs = [], []
+    for spec in sorted(set(a) | set(b)):
+        if spec[0] in skip:
+            continue
+        pa, pb = a.get(spec, []), b.get(spec, [])
+        for (i, j), members in tileIndex(polygonBoxes(pa + pb), tileSize).items():
+            box = np.array([[i, j], [i+1, j+1]]) * tileSize
+            specs.append(spec)
+            jobs.append( ([pa[k] for k in members if k < len(pa)], [pb[k - len(pa)] for k in members if k >= len(pa)], box) )
+    results = tiledMap(xorTile, jobs, processes, pool)
+    report = {spec: {'area': 0.0, 'locations': []} for spec in dict.fromkeys(specs)}
+    for spec, (area, box) in zip(specs, results):
+        report[spec]['area'] += area
+        if area > minArea:
+            report[spec]['locations'].append((area, box))
+    for entry in report.values():
+        entry['locations'].sort(key=lambda location: -location[0])
+    return report
+
+# spatial index
+# A uniform grid over the bounding boxes of the polygons of a die or a wafer. Every polygon is listed in the grid
+# cells its box overlaps, so a query only looks at the polygons of the cells it touches instead of all of them.
+# The few polygons spanning many cells (wafer, chip outlines, resonators) are kept aside and always checked.
+
+def flatPolygons(parts):
+    # all polygons of parts and their layers, references are resolved
+    polygons, layers = [], []
+    for a in realize(parts):
+        if hasattr(a, 'polygons'):
+            polygons += a.polygons
+            layers += a.layers
+        else:
+            for (layer, datatype), points in a.get_polygons(by_spec=True).items():
+                polygons += points
+                layers += [layer] * len(points)
+    return polygons, np.array(layers, dtype=int)
+def boxDistances(boxes, point):
+    # distance from point to every box, 0 inside
+    d = np.maximum(np.maximum(boxes[:, 0] - point, point - boxes[:, 1]), 0)
+    return np.hypot(d[:, 0], d[:, 1])
+
+maxIndexCells = 16 # polygons spanning more grid cells are not binned
+
+class SpatialIndex:
+    """Uniform grid index over the bounding boxes of polygons.
+
+        index = SpatialIndex(filledChip(conf, texts))
+        index.query([[x0, y0], [x1, y1]], layer=12)   polygons whose box overlaps the region
+        index.nearest([x, y], layer=12, k=3)            the 3 polygons with the closest boxes
+        index.overlapPairs(layer=12, distance=1)        pairs of polygons closer than 1 um
+
+    Results are indices into index.polygons, index.layers and index.boxes.
+    """
+    def __init__(self, parts, cellSize=None):
+        self.polygons, self.layers = flatPolygons(parts)
+        self.boxes = polygonBoxes(self.polygons)
+        sizes = self.boxes[:, 1] - self.boxes[:, 0]
+        if cellSize is None:
+            # twice the typical polygon
+            cellSize = max(2 * np.median(sizes.max(axis=1)), 1) if len(sizes) else 1
+        self.cellSize = cellSize
+        self.large = np.flatnonzero(np.prod(sizes / cellSize + 1, axis=1) > maxIndexCells)
+        self.cells = self.binBoxes(self.boxes)
+    def binBoxes(self, boxes):
+        small = np.setdiff1d(np.arange(len(boxes)), self.large)
+        return {cell: small[members] for cell, members in tileIndex(boxes[small], self.cellSize).items()} if len(small) else {}
+    def query(self, box, layer=None):
+        # indices of the polygons on layer (all layers for None) whose box overlaps box
+        box = np.asarray(box, dtype=float)
+        first, last = np.floor(box / self.cellSize).astype(int)
+        if np.prod(last - first + 1) > len(self.cells):
+            cells = [cell for cell in self.cells if (first <= cell).all() and (cell <= last).all()]
+        else:
+            cells = [(i, j) for i in range(first[0], last[0] + 1) for j in range(first[1], last[1] + 1) if (i, j) in self.cells]
+        members = np.unique(np.concatenate([self.large] + [self.cells[cell] for cell in cells]))
+        boxes = self.boxes[members]
+        inside = ((boxes[:, 0] <= box[1]) & (box[0] <= boxes[:, 1])).all(axis=1)
+        if layer is not None:
+            inside &= self.layers[members] == layer
+        return members[inside]
+    def nearest(self, point, layer=None, k=1):
+        # indices of the k polygons on layer whose boxes are closest to point, nearest first
+        point = np.asarray(point, dtype=float)
+        extent = np.abs(self.boxes - point).max() if len(self.boxes) else 0
+        radius = self.cellSize
+        while True:
+            members = self.query([point - radius, point + radius], layer)
+            distances = boxDistances(self.boxes[members], point)
+            order = np.argsort(distances, kind='stable')[:k]
+            # every box within radius is among the members, so the result is final once the k-th one is within radius
+            if (len(order) == k and distances[order[-1]] <= radius) or radius > extent:
+                return members[order]
+            radius *= 2
+    def overlapPairs(self, layer=None, other=None, distance=0):
+        """Pairs of polygons whose boxes overlap or are closer than distance.
+
+        Args:
+            layer (int, optional): Layer of the first polygon of every pair. Defaults to None, any layer.
+            other (int, optional): Layer of the second polygon. Defaults to None, the same layer as the first.
+            distance (float, optional): Gap up to which boxes count as overlapping. Defaults to 0.
+
+        Returns:
+            array: (n, 2) indices, sorted within a pair unless other is given
+        """
+        boxes = self.boxes + [[-distance/2], [distance/2]]
+        cells = self.binBoxes(boxes) if distance else self.cells
+        pairs = [np.zeros((0, 2), dtype=int)]
+        for members in cells.values():
+            first = members if layer is None else members[self.layers[members] == layer]
+            second = first if other is None else members[self.layers[members] == other]
+            if other is None:
+                i, j = np.triu_indices(len(first), 1)
+                i, j = first[i], first[j]
+            else:
+                i, j = np.repeat(first, len(second)), np.tile(second, len(first))
+            near = ((boxes[i, 0] <= boxes[j, 1]) & (boxes[j, 0] <= boxes[i, 1])).all(axis=1) & (i != j)
+            if other is None:
+                near &= self.layers[i] == self.layers[j]
+            pairs.append(np.stack([i[near], j[near]], axis=1))
+        # the large polygons against all others
+        everything = np.arange(len(boxes))
+        isLayer = lambda l, layer: layer is None or l == layer
+        for k in self.large:
+            near = ((boxes[k, 0] <= boxes[:, 1]) & (boxes[:, 0] <= boxes[k, 1])).all(axis=1) & (everything != k)
+            if other is None:
+                if isLayer(self.layers[k], layer):
+                    j = everything[near & (self.layers == self.layers[k])]
+                    pairs.append(np.stack([np.full(len(j), k), j], axis=1))
+                continue
+            if isLayer(self.layers[k], layer):
+                j = everything[near & (self.layers == other)]
+                pairs.append(np.stack([np.full(len(j), k), j], axis=1))
+            if self.layers[k] == other:
+                i = everything[near & isLayer(self.layers, layer)]
+                pairs.append(np.stack([i, np.full(len(i), k)], axis=1))
+        pairs = np.concatenate(pairs)
+        return np.unique(np.sort(pairs, axis=1) if other is None else pairs, axis=0)
+
+# design rules
+# Minimum width and spacing per layer and minimum enclosure of one layer by another (drcMinWidth, drcMinSpacing,
+# drcMinEnclosure), checked tile by tile in the worker pool with round offsets:
+#   width       what an opening (shrink, then grow by width/2) removes from the layer
+#   spacing     what a closing (grow, then shrink by spacing/2) adds to the layer
+#   enclosure   what of the inner layer grown by the distance lies outside of the outer layer
+# The openings also cut off sharp corners, so only violations extending over at least the rule distance count.
+# Every tile gets the polygons within twice the largest rule distance around it, violations are clipped to the tile.
+
+drcSliver = 0.02 # violations thinner than this fraction of the rule distance are rounding artifacts
+
+def layerPolygons(parts):
+    # layer -> polygons of parts, references are resolved
+    polygons, layers = flatPolygons(parts)
+    grouped = {}
+    for polygon, layer in zip(polygons, layers.tolist()):
+        grouped.setdefault(layer, []).append(polygon)
+    return grouped
+def designRules(conf: DefaultConfig):
+    # (rule, layer, other layer, distance) of every rule
+    return ([('width', layer, None, d) for layer, d in conf.drcMinWidth]
+        + [('spacing', layer, None, d) for layer, d in conf.drcMinSpacing]
+        + [('enclosure', layer, other, d) for layer, other, d in conf.drcMinEnclosure])
+def checkTile(layers, rules, box):
+    # violations of the rules within box: (rule, layer, other layer, distance, bounding box)
+    grow = lambda polygons, d: offset(polygons, d, join='round', tolerance=32, join_first=True, max_points=0)
+    # the polygons are clipped to the tile and twice the rule distance around it, the cut edges are too far out
+    # to cause violations within the tile
+    clip = lambda polygons, margin: polygons and boolean(polygons, gdspy.Rectangle(box[0] - margin, box[1] + margin), 'and', max_points=0)
+    tile = gdspy.Rectangle(*box)
+    violations = []
+    for rule, layer, other, d in rules:
+        polygons = clip(layers.get(layer), 2*d)
+        if not polygons:
+            continue
+        if rule == 'width':
+            shrunk = grow(polygons, -d/2)
+            region = boolean(polygons, shrunk and grow(shrunk, d/2), 'not', max_points=0)
+        elif rule == 'spacing':
+            region = boolean(grow(grow(polygons, d/2), -d/2), polygons, 'not', max_points=0)
+        else:
+            region = boolean(grow(polygons, d), clip(layers.get(other), 2*d), 'not', max_points=0)
+        # slivers along the edges come from the polygonal round offsets and are removed by a small opening
+        region = region and grow(grow(region, -d * drcSliver), d * drcSliver)
+        region = region and boolean(region, tile, 'and', max_points=0)
+        for points in (region.polygons if region else []):
+            point1, point2 = points.min(axis=0), points.max(axis=0)
+            if (point2 - point1).max() >= d:
+                violations.append((rule, layer, other, d, np.array([point1, point2])))
+    return violations
+def checkRules(conf: DefaultConfig, layers, tileSize=1000, processes=None, pool=None):
+    """Check the design rules of conf on a layout.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables, the rules are drcMinWidth, drcMinSpacing and drcMinEnclosure
+        layers (dict): layer -> polygons, e.g. layerPolygons(parts)
+        tileSize (float, optional): Edge length of the tiles in um. Defaults to 1000.
+        processes (int, optional): Number of worker processes, 1 checks in this process. Defaults to the number of cores.
+        pool (Executor, optional): Existing pool to reuse, overrides processes. Defaults to None.
+
+    Returns:
+        list: (rule, layer, other layer, distance, bounding box) of every violation
+    """
+    rules = designRules(conf)
+    used = sorted({layer for rule, layer, other, d in rules} | {other for rule, layer, other, d in rules if other is not None})
+    halo = 2 * max([d for rule, layer, other, d in rules], default=0)
+    polygons = [p for layer in used for p in layers.get(layer, [])]
+    polygonLayers = [layer for layer in used for p in layers.get(layer, [])]
+    jobs = []
+    for (i, j), members in tileIndex(polygonBoxes(polygons) + [[-halo], [halo]], tileSize).items():
+        tileLayers = {}
+        for k in members:
+            tileLayers.setdefault(polygonLayers[k], []).append(polygons[k])
+        jobs.append( (tileLayers, rules, np.array([[i, j], [i+1, j+1]]) * tileSize) )
+    return [violation for violations in tiledMap(checkTile, jobs, processes, pool) for violation in violations]
+def checkFile(conf: DefaultConfig, filename, tileSize=1000, processes=None, pool=None):
+    # checks the design rules on a written GDS file, all datatypes of a layer count as that layer
+    layers = {}
+    for (layer, datatype), polygons in readLayers(filename).items():
+        layers.setdefault(layer, []).extend(polygons)
+    return checkRules(conf, layers, tileSize, processes, pool)
+def printViolations(violations, limit=5):
+    # number of violations per rule and the first few locations
+    groups = {}
+    for rule, layer, other, d, box in violations:
+        groups.setdefault((rule, layer, other, d), []).append(box)
+    for (rule, layer, other, d), boxes in sorted(groups.items(), key=lambda item: str(item[0])):
+        print('%-9s layer %2d%s %g um: %d violations' % (rule, layer, ' in %d' % other if other is not None else '', d, len(boxes)))
+        for box in boxes[:limit]:
+            print('    x %.3f..%.3f y %.3f..%.3f' % (box[0][0], box[1][0], box[0][1], box[1][1]))
+    if not violations:
+        print('no design rule violations')
+
+# writefields
+# The writer exposes one writefield (gridSize) after the other, polygons crossing a field boundary get stitching
+# errors. fractureParts cuts the polygons at the fields of the grid: the fields of all polygons are found at once
+# from their bounding boxes, polygons within one field are kept as they are, rectangles are cut with array
+# operations and only the other polygons are sliced at the field boundaries they cross. fieldShift moves the grid
+# so that the junctions lie within one field, makeGrid draws the moved grid.
+
+def maxPoints(conf: DefaultConfig, layer):
+    # most vertices of a polygon on the layer
+    return dict(conf.fieldMaxPointsLayers).get(layer, conf.fieldMaxPoints)
+def freeShift(low, high, period):
+    # smallest shift s of the boundaries k*period + s that has none of them inside any interval (low, high),
+    # None if there is none
+    if len(low) == 0:
+        return 0.0
+    start, width = np.mod(low, period), high - low
+    if (width >= period).any():
+        return None
+    # the best shift is 0 or touches one of the intervals
+    candidates = np.mod(np.concatenate([[0], start, start + width]) + period/2, period) - period/2
+    inside = np.mod(candidates[:, None] - start, period)
+    free = candidates[~((inside > 1e-9) & (inside < width - 1e-9)).any(axis=1)]
+    return free[np.argmin(abs(free))].item() if len(free) else None
+def fieldShift(conf: DefaultConfig, parts):
+    # shift of the grid from makeGrid that keeps the structures on fieldKeepLayers within one field each
+    polygons, layers = flatPolygons(parts)
+    keep = [p for p, layer in zip(polygons, layers.tolist()) if layer in conf.fieldKeepLayers]
+    if not keep:
+        return (0, 0)
+    # touching parts of one structure are merged by the offset
+    regions = offset(keep, conf.fieldKeepMargin, join_first=True, max_points=0)
+    boxes = polygonBoxes(regions.polygons)
+    # the field boundaries of the unshifted grid are at (k + 1/2) * gridSize
+    shift = [freeShift(boxes[:, 0, k] - size/2, boxes[:, 1, k] - size/2, size) for k, size in enumerate(conf.gridSize)]
+    if None in shift:
+        raise ValueError('no shift of the writefield grid keeps all structures on layers %s within one field' % (conf.fieldKeepLayers,))
+    return tuple(shift)
+def isRectangle(polygons):
+    # which polygons are axis aligned rectangles: 4 vertices and the area of their bounding box
+    rectangle = np.array([len(p) == 4 for p in polygons], dtype=bool)
+    if rectangle.any():
+        points = np.array([p for p, four in zip(polygons, rectangle) if four])
+        x, y = points[..., 0], points[..., 1]
+        area = abs((x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1)) / 2
+        boxArea = np.prod(points.max(axis=1) - points.min(axis=1), axis=1)
+        rectangle[rectangle] = np.isclose(area, boxArea, rtol=1e-9, atol=1e-12)
+    return rectangle
+def cutRectangles(boxes, first, last, size):
+    # the rectangles boxes cut at the fields, in grid coordinates: a vertex array of shape (n, 4, 2)
+    pieces = []
+    for box, (i0, j0), (i1, j1) in zip(boxes, first, last):
+        i, j = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing='ij')
+        fields = np.stack([i.ravel(), j.ravel()], axis=-1) * size
+        point1, point2 = np.maximum(box[0], fields), np.minimum(box[1], fields + size)
+        keep = (point2 > point1).all(axis=1)
+        point1, point2 = point1[keep], point2[keep]
+        pieces.append(np.stack([point1, np.stack([point2[:, 0], point1[:, 1]], axis=-1), point2,
+            np.stack([point1[:, 0], point2[:, 1]], axis=-1)], axis=1))
+    return np.concatenate(pieces) if pieces else np.zeros((0, 4, 2))
+def slicePolygon(polygon, xs, ys):
+    # pieces of the polygon between the vertical lines at xs and the horizontal lines at ys
+    pieces = []
+    for column in (gdspy.slice(gdspy.Polygon(polygon), xs, 0) if xs else [gdspy.Polygon(polygon)]):
+        for piece in (gdspy.slice(column, ys, 1) if ys and column else [column]):
+            if piece is not None:
+                pieces += piece.polygons
+    return pieces
+@profiled
+def fractureParts(conf: DefaultConfig, parts, shift=(0, 0)):
+    """Cut the polygons of parts at the writefields and cap their vertices.
+
+    References are resolved, the result is flat. The wafer outline and the grid itself are not cut. Polygons with
+    more vertices than allowed on their layer (maxPoints) are fractured further.
+
+    Args:
+        conf (DefaultConfig): dictionary holding all geometric variables, gridSize and the field* fields
+        parts (list): polygons and references, centered like the grid of makeGrid
+        shift (tuple, optional): Shift of the grid, e.g. from fieldShift. Defaults to (0, 0).
+
+    Returns:
+        list: one polygon set per (layer, datatype)
+    """
+    polygons, specs = [], []
+    for a in realize(parts):
+        if hasattr(a, 'polygons'):
+            polygons += a.polygons
+            specs += zip(a.layers, a.datatypes)
+        else:
+            for spec, points in a.get_polygons(by_spec=True).items():
+                polygons += points
+                specs += [spec] * len(points)
+    caps = {layer: maxPoints(conf, layer) for layer, datatype in set(specs)}
+    # the fields of every polygon in grid coordinates, the corner of the field around the origin is 0
+    size = np.array(conf.gridSize, dtype=float)
+    corner = np.array(shift) - size/2
+    boxes = polygonBoxes(polygons) - corner
+    first, last = np.floor(boxes / size).astype(int).transpose(1, 0, 2)
+    uncut = np.array([layer in (conf.waferLayer, conf.gridLayer) for layer, datatype in specs], dtype=bool)
+    single = (first == last).all(axis=1) | uncut
+    result = {}
+    for k in np.flatnonzero(single):
+        result.setdefault(specs[k], []).append(polygons[k])
+    # rectangles are cut without boolean operations, e.g. the outline of a die crossing thousands of fields
+    crossing = np.flatnonzero(~single)
+    rectangle = isRectangle([polygons[k] for k in crossing])
+    for spec in set(specs[k] for k in crossing[rectangle]):
+        members = [k for k in crossing[rectangle] if specs[k] == spec]
+        pieces = cutRectangles(boxes[members], first[members], last[members], size) + corner
+        result.setdefault(spec, []).extend(pieces)
+    for k in crossing[~rectangle]:
+        xs, ys = [list(corner[axis] + size[axis] * np.arange(first[k, axis] + 1, last[k, axis] + 1)) for axis in (0, 1)]
+        result.setdefault(specs[k], []).extend(slicePolygon(polygons[k], xs, ys))
+    fractured = []
+    for (layer, datatype), group in sorted(result.items()):
+        a = gdspy.PolygonSet(group, layer, datatype)
+        if layer not in (conf.waferLayer, conf.gridLayer) and max(map(len, group)) > caps[layer]:
+            a = a.fracture(caps[layer])
+        fractured.append(a)
+    return fractured